@@ -0,0 +1,142 @@
+import os
+import sys
+import json
+import random
+import asyncio
+import argparse
+import datetime
+import tempfile
+import statistics
+
+# Allow "python benchmarks/bench_context_budget.py" from the repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.tools import search_logs
+from src.chunker import chunk_markdown
+from src.context_budget import ContextBudget, message_tokens
+from src.llm import ScriptedProvider, DEFAULT_SCRIPT
+from src.activities import SYSTEM_PROMPT, AGENT_TOOLS
+
+# --- BENCHMARK: tool-output compaction and the context budget ---
+# Replays a set of incidents through the scripted LLM (DEFAULT_SCRIPT: logs, then
+# runbooks, then a summary) twice: once sending raw tool outputs, once through
+# ContextBudget. Logs are a noisy synthetic file (request IDs, latencies and stack
+# traces vary per line); runbook hits are chunks of knowledge/*.md. Reports
+# tokens per incident and the scripted time-to-summary, whose latency grows with
+# prompt size (--ms-per-1k-tokens) the way a real model's does.
+#
+#   python benchmarks/bench_context_budget.py      # defaults: 8 incidents, seed 7
+#   raw tool outputs: median 5,859 prompt tokens/incident, median time-to-summary 1189ms
+#   context budget  : median 2,018 prompt tokens/incident, median time-to-summary  806ms
+
+MESSAGES = [
+    "ERROR: Timeout connecting to db-{n}.internal:5432 after {ms}ms (request_id={uuid})",
+    "ERROR: NullPointerException at com.example.AuthService.validate(AuthService.java:{line}) "
+    "at com.example.AuthFilter.doFilter(AuthFilter.java:88) at org.apache.catalina.core.ApplicationFilterChain"
+    ".internalDoFilter(ApplicationFilterChain.java:193) at org.apache.catalina.core.StandardWrapperValve"
+    ".invoke(StandardWrapperValve.java:166) at org.apache.catalina.connector.CoyoteAdapter.service(CoyoteAdapter.java:343)",
+    "ERROR: Upstream payment-gateway returned 503 for order '{n}{ms}' in {ms}ms",
+    "ERROR: Cache miss storm: {n} keys evicted from shard {line}",
+    "ERROR: OutOfMemoryError in worker-{n}: heap {ms}MB of 4096MB",
+]
+
+
+def write_log(path, start, seconds, lines_per_second, rng):
+    with open(path, "w") as f:
+        for second in range(seconds):
+            stamp = (start + datetime.timedelta(seconds=second)).strftime("%Y-%m-%dT%H:%M:%SZ")
+            for _ in range(lines_per_second):
+                if rng.random() < 0.7:
+                    f.write(f"{stamp} INFO: request ok in {rng.randint(5, 90)}ms\n")
+                    continue
+                message = rng.choice(MESSAGES).format(
+                    n=rng.randint(0, 40), ms=rng.randint(100, 30000), line=rng.randint(1, 400),
+                    uuid="%08x-%04x-%04x-%04x-%012x" % tuple(rng.getrandbits(b) for b in (32, 16, 16, 16, 48)),
+                )
+                f.write(f"{stamp} {message}\n")
+
+
+def runbook_hits(rng, top_k=5):
+    knowledge = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "knowledge")
+    chunks = []
+    for name in sorted(os.listdir(knowledge)):
+        if name.endswith(".md"):
+            with open(os.path.join(knowledge, name)) as f:
+                chunks.extend(chunk_markdown(f.read()))
+    picked = rng.sample(chunks, min(top_k, len(chunks)))
+    return [
+        {"id": i, "content": content, "section": section, "service": None, "source": "knowledge/runbook.md",
+         "score": round(0.9 - i * 0.05, 4)}
+        for i, (section, content) in enumerate(picked)
+    ]
+
+
+async def replay(alert, tool_outputs, provider, budgeted):
+    """
+    One incident through the scripted conversation. Returns (prompt tokens, LLM seconds).
+    """
+    session = provider.start_session(SYSTEM_PROMPT, AGENT_TOOLS, alert)
+    budget = ContextBudget()
+    prompt = f"New Incident Alert: {json.dumps(alert)}"
+    budget.add_prompt(SYSTEM_PROMPT + prompt)
+
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    input_tokens = 0
+    response = await session.send(prompt)
+    while response.tool_calls:
+        input_tokens += response.input_tokens
+        budget.add_reply(response)
+        results = [(call, json.dumps(tool_outputs[call.name])) for call in response.tool_calls]
+        if budgeted:
+            results = budget.fit_tool_results(results)
+        response = await session.send_tool_results(results)
+    input_tokens += response.input_tokens
+    return input_tokens, loop.time() - started
+
+
+async def run(args):
+    rng = random.Random(args.seed)
+    start = datetime.datetime(2025, 10, 21, 3, 0, tzinfo=datetime.timezone.utc)
+    provider = ScriptedProvider(latency_ms=args.latency_ms, ms_per_1k_tokens=args.ms_per_1k_tokens)
+    provider.scripts = [DEFAULT_SCRIPT]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        log_file = os.path.join(tmp, "service.log")
+        write_log(log_file, start, args.minutes * 60, args.lines_per_second, rng)
+
+        results = {False: [], True: []}
+        for i in range(args.incidents):
+            alert_time = start + datetime.timedelta(seconds=rng.randint(30, args.minutes * 60 - 30))
+            alert = {"timestamp": alert_time.strftime("%Y-%m-%dT%H:%M:%SZ"), "service": "auth-service",
+                     "error_message": "High CPU Utilization"}
+            tool_outputs = {
+                "search_logs": search_logs(alert["timestamp"], log_file=log_file, time_window_seconds=60),
+                "search_runbooks": runbook_hits(rng),
+            }
+            if i == 0:
+                raw = sum(message_tokens(output) for output in tool_outputs.values())
+                print(f"--- 🧪 Raw tool output for one incident: ~{raw:,} tokens ---")
+            for budgeted in (False, True):
+                results[budgeted].append(await replay(alert, tool_outputs, provider, budgeted))
+
+    for budgeted, label in ((False, "raw tool outputs"), (True, "context budget  ")):
+        tokens = [tokens for tokens, _ in results[budgeted]]
+        seconds = [seconds for _, seconds in results[budgeted]]
+        print(f"{label}: median {statistics.median(tokens):>8,.0f} prompt tokens/incident, "
+              f"median time-to-summary {statistics.median(seconds) * 1000:>7.0f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tokens and time-to-summary with and without compaction.")
+    parser.add_argument("--incidents", type=int, default=8)
+    parser.add_argument("--minutes", type=int, default=30, help="Length of the synthetic log")
+    parser.add_argument("--lines-per-second", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=200, help="Scripted base latency per LLM call")
+    parser.add_argument("--ms-per-1k-tokens", type=float, default=100, help="Scripted latency per 1K prompt tokens")
+    parser.add_argument("--seed", type=int, default=7)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,529 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import socket
+import asyncio
+import argparse
+import datetime
+import platform
+import tempfile
+import statistics
+import subprocess
+
+import httpx
+from temporalio.client import Client
+from temporalio.api.enums.v1 import EventType
+from temporalio.testing import WorkflowEnvironment
+
+# Allow "python benchmarks/bench_pipeline.py" from the repo root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_context_budget import write_log
+
+# --- BENCHMARK: end-to-end alert -> summary pipeline ---
+# Starts the whole stack on this machine and measures it under load:
+#   - Temporal: `temporal server start-dev` if the CLI is installed, otherwise the
+#     SDK's local dev server (downloaded on first use); or --temporal-address
+#   - the worker (all profiles, -n processes) with the scripted LLM
+#   - the API (uvicorn main:app)
+# Logs are a synthetic per-service corpus; runbooks are a synthetic knowledge dir
+# ingested into --db with the offline "hash" embedding. --db must be a scratch
+# database: ingest syncs its runbook_chunks table to the synthetic corpus, adding
+# the synthetic chunks and deleting every chunk that is not part of it.
+#
+# Workloads, sent open-loop to POST /webhook/alert:
+#   steady  --rate alerts/s for --duration seconds, every alert a new incident
+#   burst   --bursts bursts of --burst-size alerts, --burst-interval seconds apart
+#   storm   --storm-alerts alerts in --storm-seconds, repeating --storm-signatures
+#           incidents (most alerts coalesce into a running workflow)
+#
+# Reported per workload (p50/p95/p99/max, ms):
+#   workflow_start_ms       POST /webhook/alert round trip (signal-with-start + store write)
+#   time_to_summary_ms      first alert of an incident sent -> summary recorded in the incident store
+#   queue_wait_ms           per activity: scheduled -> picked up by a worker (from workflow history)
+#   throughput              alerts accepted/s and summaries/s
+#
+#   python benchmarks/bench_pipeline.py --db postgresql://localhost/fireline_bench \
+#       --workloads steady,burst,storm --output results/pipeline.json
+#   python benchmarks/bench_pipeline.py --db ... --compare results/pipeline.json --max-regression 15
+
+SERVICES = ["auth-service", "payment-service", "frontend-app"]
+ERRORS = ["High CPU Utilization", "Database Connection Timeout", "500 Internal Server Error",
+          "OutOfMemoryError", "Upstream 503 from payment-gateway"]
+LOG_START = datetime.datetime(2025, 10, 21, 3, 0, tzinfo=datetime.timezone.utc)
+REPORTED_PERCENTILES = (50, 95, 99)
+COMPARED_METRICS = ("workflow_start_ms", "time_to_summary_ms")
+
+
+# --- SYNTHETIC CORPUS ---
+
+def write_runbooks(knowledge_dir, rng):
+    """
+    knowledge/<service>/runbook.md with one section per error, plus a shared runbook.
+    """
+    steps = ["Check the deployment history and roll back the last release.",
+             "Scale the deployment up by two replicas and watch saturation.",
+             "Fail over to the replica and page the database on-call.",
+             "Flush the cache shard and re-warm it from the primary.",
+             "Raise the heap limit and capture a heap dump for the owning team."]
+    for service in SERVICES:
+        os.makedirs(os.path.join(knowledge_dir, service), exist_ok=True)
+        with open(os.path.join(knowledge_dir, service, "runbook.md"), "w") as f:
+            f.write(f"# {service} Runbook\n\n")
+            for error in ERRORS:
+                f.write(f"## {error}\n\nSymptoms: {error} on {service}.\n\n")
+                for i, step in enumerate(rng.sample(steps, 3), 1):
+                    f.write(f"{i}. {step}\n")
+                f.write("\n")
+    with open(os.path.join(knowledge_dir, "general.md"), "w") as f:
+        f.write("# General Incident Response\n\n## Escalation\n\nPage the service owner after 15 minutes.\n")
+
+
+def build_corpus(workdir, args, rng):
+    log_root = os.path.join(workdir, "logs")
+    for service in SERVICES:
+        os.makedirs(os.path.join(log_root, service))
+        write_log(os.path.join(log_root, service, f"{service}.log"), LOG_START, args.log_minutes * 60,
+                  args.lines_per_second, rng)
+    knowledge_dir = os.path.join(workdir, "knowledge")
+    write_runbooks(knowledge_dir, rng)
+    return log_root, knowledge_dir
+
+
+# --- WORKLOADS ---
+
+def alert_time(rng, args):
+    offset = rng.randint(60, args.log_minutes * 60 - 60)
+    return (LOG_START + datetime.timedelta(seconds=offset)).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def unique_alert(name, i, rng, args):
+    # The suffix defeats coalescing and the investigation cache: every alert is a full run
+    return {"timestamp": alert_time(rng, args), "service": rng.choice(SERVICES),
+            "error_message": f"{rng.choice(ERRORS)} [{name}-{i}]"}
+
+
+def build_workload(name, args, rng):
+    """
+    [(seconds after the workload starts, alert), ...]
+    """
+    if name == "steady":
+        count = int(args.rate * args.duration)
+        return [(i / args.rate, unique_alert(name, i, rng, args)) for i in range(count)]
+    if name == "burst":
+        return [
+            (burst * args.burst_interval, unique_alert(name, burst * args.burst_size + i, rng, args))
+            for burst in range(args.bursts) for i in range(args.burst_size)
+        ]
+    if name == "storm":
+        signatures = [unique_alert(name, i, rng, args) for i in range(args.storm_signatures)]
+        return sorted(
+            ((rng.uniform(0, args.storm_seconds), dict(rng.choice(signatures))) for _ in range(args.storm_alerts)),
+            key=lambda item: item[0],
+        )
+    raise ValueError(f"Unknown workload '{name}'. Choose from: steady, burst, storm")
+
+
+# --- STACK ---
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def spawn(command, name, workdir, env=None):
+    log = open(os.path.join(workdir, f"{name}.log"), "w")
+    print(f"--- 🚀 Starting {name}: {' '.join(command)} (output: {log.name}) ---")
+    return subprocess.Popen(command, cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+async def start_temporal(args, workdir):
+    """
+    Returns (address, handle to stop it, or None if it was already running).
+    """
+    if args.temporal_address:
+        return args.temporal_address, None
+
+    cli = shutil.which(args.temporal_cli)
+    if cli is None:
+        print("--- ⏱️ Temporal CLI not found; starting the SDK's local dev server ---")
+        env = await WorkflowEnvironment.start_local()
+        return env.client.service_client.config.target_host, env
+
+    port = free_port()
+    process = spawn([cli, "server", "start-dev", "--headless", "--ip", "127.0.0.1", "--port", str(port),
+                     "--log-level", "error"], "temporal", workdir)
+    address = f"127.0.0.1:{port}"
+    deadline = time.monotonic() + args.startup_timeout
+    while True:
+        try:
+            await Client.connect(address)
+            return address, process
+        except Exception:
+            if process.poll() is not None or time.monotonic() > deadline:
+                raise RuntimeError(f"Temporal dev server did not start; see {workdir}/temporal.log")
+            await asyncio.sleep(0.5)
+
+
+async def stop(handle):
+    if handle is None:
+        return
+    if isinstance(handle, WorkflowEnvironment):
+        await handle.shutdown()
+        return
+    handle.terminate()  # Workers drain in-flight activities on SIGTERM
+    try:
+        await asyncio.to_thread(handle.wait, 30)
+    except subprocess.TimeoutExpired:
+        handle.kill()
+
+
+def stack_env(args, workdir, temporal_address, log_root, knowledge_dir):
+    env = dict(os.environ)
+    env.update({
+        "TEMPORAL_ADDRESS": temporal_address,
+        "DB_CONNECTION": args.db,
+        "EMBEDDING_PROVIDER": "hash",
+        "KNOWLEDGE_DIR": knowledge_dir,
+        "LOG_ROOT": log_root,
+        "LLM_PROVIDER": "scripted",
+        "LLM_SCRIPTED_LATENCY_MS": str(args.llm_latency_ms),
+        "LLM_SCRIPTED_JITTER_MS": str(args.llm_jitter_ms),
+        "LLM_SCRIPTED_MS_PER_1K_TOKENS": str(args.ms_per_1k_tokens),
+        # Fresh state every run, so earlier runs can't serve results from cache
+        "INCIDENT_STORE_URL": f"sqlite:///{workdir}/incidents.sqlite",
+        "EMBEDDING_CACHE_PATH": os.path.join(workdir, "embeddings.sqlite"),
+        "INVESTIGATION_CACHE_PATH": os.path.join(workdir, "investigations.sqlite"),
+        "WORKER_DRAIN_SECONDS": "10",
+        "PYTHONUNBUFFERED": "1",
+    })
+    env.pop("SLACK_WEBHOOK_URL", None)
+    env.pop("SLACK_CHANNEL_WEBHOOKS", None)
+    return env
+
+
+async def wait_for_api(http, api, args):
+    deadline = time.monotonic() + args.startup_timeout
+    while True:
+        try:
+            if (await http.get(f"{api}/incidents", params={"limit": 1})).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        if time.monotonic() > deadline:
+            raise RuntimeError("API did not come up; see api.log")
+        await asyncio.sleep(0.5)
+
+
+# --- MEASUREMENT ---
+
+async def send_alert(http, api, alert, sent):
+    started_at = time.time()
+    started = time.perf_counter()
+    try:
+        response = await http.post(f"{api}/webhook/alert", json=alert)
+        body = response.json() if response.status_code == 200 else {}
+        status = response.status_code
+    except httpx.HTTPError as e:
+        body, status = {}, type(e).__name__
+    sent.append({
+        "sent_at": started_at,
+        "latency_ms": (time.perf_counter() - started) * 1000,
+        "http_status": status,
+        "id": body.get("id"),
+        "created": body.get("status") == "investigation_workflow_started",
+    })
+
+
+async def fire(http, api, workload):
+    """
+    Sends every alert at its offset, without waiting for earlier responses (open loop).
+    """
+    sent, tasks = [], []
+    started = time.monotonic()
+    for offset, alert in workload:
+        delay = started + offset - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(send_alert(http, api, alert, sent)))
+    await asyncio.gather(*tasks)
+    return sent
+
+
+async def delta_cursor(http, api):
+    response = await http.get(f"{api}/incidents", params={"limit": 1, "fields": "id"})
+    return response.json()["next_since"]
+
+
+async def wait_for_summaries(http, api, since, ids, timeout):
+    """
+    Follows the /incidents delta feed until every incident in `ids` has a summary.
+    Returns the ids still missing one.
+    """
+    pending = set(ids)
+    deadline = time.monotonic() + timeout
+    while pending and time.monotonic() < deadline:
+        response = await http.get(f"{api}/incidents", params={"since": since, "fields": "id,summary", "limit": 500})
+        body = response.json()
+        pending -= {row["id"] for row in body["incidents"] if row.get("summary")}
+        since = body["next_since"]
+        if not body["has_more"]:
+            await asyncio.sleep(0.25)
+    return pending
+
+
+def event_seconds(event):
+    return event.event_time.ToMicroseconds() / 1e6
+
+
+async def workflow_timings(client, workflow_id):
+    """
+    From the workflow history: when it started, per-activity queue waits, and when
+    the summary was recorded (the first record_incident after run_investigation).
+    """
+    history = await client.get_workflow_handle(workflow_id).fetch_history()
+    scheduled = {}  # event_id -> (activity name, scheduled at)
+    queue_waits = []
+    started_at = investigated_at = summary_at = None
+    for event in history.events:
+        if event.event_type == EventType.EVENT_TYPE_WORKFLOW_EXECUTION_STARTED:
+            started_at = event_seconds(event)
+        elif event.event_type == EventType.EVENT_TYPE_ACTIVITY_TASK_SCHEDULED:
+            name = event.activity_task_scheduled_event_attributes.activity_type.name
+            scheduled[event.event_id] = (name, event_seconds(event))
+        elif event.event_type == EventType.EVENT_TYPE_ACTIVITY_TASK_STARTED:
+            name, at = scheduled[event.activity_task_started_event_attributes.scheduled_event_id]
+            queue_waits.append((name, (event_seconds(event) - at) * 1000))
+        elif event.event_type == EventType.EVENT_TYPE_ACTIVITY_TASK_COMPLETED:
+            name, _ = scheduled[event.activity_task_completed_event_attributes.scheduled_event_id]
+            if name == "run_investigation" and investigated_at is None:
+                investigated_at = event_seconds(event)
+            elif name == "record_incident" and investigated_at is not None and summary_at is None:
+                summary_at = event_seconds(event)
+    return {"started_at": started_at, "summary_at": summary_at or investigated_at, "queue_waits": queue_waits}
+
+
+def percentiles(values):
+    if not values:
+        return None
+    values = sorted(values)
+    cuts = statistics.quantiles(values, n=100, method="inclusive") if len(values) > 1 else values * 99
+    summary = {f"p{p}": round(cuts[p - 1], 1) for p in REPORTED_PERCENTILES}
+    summary.update(mean=round(statistics.fmean(values), 1), max=round(values[-1], 1), count=len(values))
+    return summary
+
+
+async def run_workload(name, args, rng, http, api, client):
+    workload = build_workload(name, args, rng)
+    print(f"--- 🔥 Workload '{name}': {len(workload)} alert(s) over {workload[-1][0]:.1f}s ---")
+    since = await delta_cursor(http, api)
+    started = time.time()
+    sent = await fire(http, api, workload)
+    sent_seconds = time.time() - started
+
+    accepted = [alert for alert in sent if alert["http_status"] == 200]
+    first_sent = {}  # workflow id -> when the alert that started it was sent
+    for alert in accepted:
+        if alert["created"]:
+            first_sent[alert["id"]] = alert["sent_at"]
+    missing = await wait_for_summaries(http, api, since, first_sent, args.timeout)
+    if missing:
+        print(f"--- ⚠️ {len(missing)} incident(s) had no summary after {args.timeout}s ---")
+
+    semaphore = asyncio.Semaphore(20)
+
+    async def timings(workflow_id):
+        async with semaphore:
+            return workflow_id, await workflow_timings(client, workflow_id)
+
+    histories = dict(await asyncio.gather(*(timings(workflow_id) for workflow_id in first_sent)))
+    time_to_summary, queue_waits, summary_times = [], {}, []
+    for workflow_id, timing in histories.items():
+        for activity_name, wait_ms in timing["queue_waits"]:
+            queue_waits.setdefault(activity_name, []).append(wait_ms)
+        if timing["summary_at"] is not None:
+            time_to_summary.append((timing["summary_at"] - first_sent[workflow_id]) * 1000)
+            summary_times.append(timing["summary_at"])
+
+    elapsed = (max(summary_times) - started) if summary_times else None
+    return {
+        "alerts_sent": len(sent),
+        "alerts_accepted": len(accepted),
+        "alerts_failed": len(sent) - len(accepted),
+        "incidents_started": len(first_sent),
+        "alerts_coalesced": len(accepted) - len(first_sent),
+        "summaries": len(time_to_summary),
+        "summaries_missing": len(missing),
+        "workflow_start_ms": percentiles([alert["latency_ms"] for alert in accepted]),
+        "time_to_summary_ms": percentiles(time_to_summary),
+        "queue_wait_ms": {activity_name: percentiles(waits) for activity_name, waits in sorted(queue_waits.items())},
+        "throughput": {
+            "alerts_accepted_per_s": round(len(accepted) / sent_seconds, 2) if sent_seconds else None,
+            "summaries_per_s": round(len(summary_times) / elapsed, 2) if elapsed else None,
+            "seconds_to_last_summary": round(elapsed, 2) if elapsed else None,
+        },
+    }
+
+
+# --- REPORTING ---
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(results):
+    for name, workload in results["workloads"].items():
+        print(f"\n=== {name}: {workload['alerts_accepted']}/{workload['alerts_sent']} accepted, "
+              f"{workload['incidents_started']} incident(s), {workload['alerts_coalesced']} coalesced, "
+              f"{workload['summaries']} summarised ===")
+        rows = [("workflow start", workload["workflow_start_ms"]), ("time-to-summary", workload["time_to_summary_ms"])]
+        rows += [(f"queue wait {activity_name}", waits) for activity_name, waits in workload["queue_wait_ms"].items()]
+        for label, stats in rows:
+            if stats:
+                print(f"{label:<34} p50 {stats['p50']:>8.1f}ms  p95 {stats['p95']:>8.1f}ms  "
+                      f"p99 {stats['p99']:>8.1f}ms  max {stats['max']:>8.1f}ms")
+        throughput = workload["throughput"]
+        print(f"{'throughput':<34} {throughput['alerts_accepted_per_s']} alerts/s accepted, "
+              f"{throughput['summaries_per_s']} summaries/s")
+
+
+def compare(results, baseline, max_regression):
+    """
+    Prints p50/p95/p99 changes against a previous results file. Returns the
+    regressions larger than max_regression percent.
+    """
+    print(f"\n=== Compared with {baseline['run'].get('git_commit')} ({baseline['run'].get('started_at')}) ===")
+    regressions = []
+    for name, workload in results["workloads"].items():
+        before = baseline["workloads"].get(name)
+        if before is None:
+            continue
+        for metric in COMPARED_METRICS:
+            if not workload[metric] or not before.get(metric):
+                continue
+            for p in REPORTED_PERCENTILES:
+                key = f"p{p}"
+                old, new = before[metric][key], workload[metric][key]
+                change = (new - old) / old * 100 if old else 0.0
+                flag = ""
+                if change > max_regression:
+                    flag = "  ⚠️ regression"
+                    regressions.append(f"{name} {metric} {key} {change:+.1f}%")
+                print(f"{name:<8} {metric:<20} {key:<4} {old:>9.1f} -> {new:>9.1f}ms ({change:+6.1f}%){flag}")
+    return regressions
+
+
+async def run(args):
+    rng = random.Random(args.seed)
+    workloads = [name.strip() for name in args.workloads.split(",") if name.strip()]
+    for name in workloads:
+        build_workload(name, args, random.Random(0))  # Fail fast on a typo
+
+    workdir = tempfile.mkdtemp(prefix="fireline-bench-")
+    temporal = worker = api_process = None
+    results = {
+        "run": {"started_at": datetime.datetime.now(datetime.timezone.utc).isoformat(), "git_commit": git_commit(),
+                "python": platform.python_version(), "cpus": os.cpu_count()},
+        "config": vars(args),
+        "workloads": {},
+    }
+    try:
+        log_root, knowledge_dir = build_corpus(workdir, args, rng)
+        temporal_address, temporal = await start_temporal(args, workdir)
+        env = stack_env(args, workdir, temporal_address, log_root, knowledge_dir)
+
+        print("--- 📚 Ingesting the synthetic runbooks... ---")
+        subprocess.run([sys.executable, "-m", "src.ingest"], cwd=ROOT, env=env, check=True,
+                       stdout=subprocess.DEVNULL)
+
+        worker = spawn([sys.executable, "worker.py", "-n", str(args.worker_processes)], "worker", workdir, env)
+        port = free_port()
+        api_process = spawn([sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+                            "api", workdir, env)
+        api = f"http://127.0.0.1:{port}"
+        client = await Client.connect(temporal_address)
+
+        limits = httpx.Limits(max_connections=args.connections, max_keepalive_connections=args.connections)
+        async with httpx.AsyncClient(timeout=60, limits=limits) as http:
+            await wait_for_api(http, api, args)
+
+            # Warm-up: one incident end to end, so imports and connections aren't measured
+            since = await delta_cursor(http, api)
+            warmup = []
+            await send_alert(http, api, unique_alert("warmup", 0, rng, args), warmup)
+            if warmup[0]["id"] is None or await wait_for_summaries(http, api, since, [warmup[0]["id"]], args.startup_timeout):
+                raise RuntimeError(f"Warm-up incident was not summarised; see the logs in {workdir}")
+
+            for name in workloads:
+                results["workloads"][name] = await run_workload(name, args, rng, http, api, client)
+    finally:
+        for handle in (api_process, worker, temporal):
+            await stop(handle)
+
+    print_report(results)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n--- 💾 Results written to {args.output} ---")
+
+    regressions = []
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.max_regression)
+
+    if args.keep:
+        print(f"--- 📁 Logs and state kept in {workdir} ---")
+    else:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end alert -> summary latency and throughput.")
+    parser.add_argument("--db", default=os.environ.get("BENCH_DB_CONNECTION"),
+                        help="Scratch Postgres (pgvector) DSN; ingest syncs its runbook_chunks table "
+                             "to the synthetic corpus, deleting any other chunks")
+    parser.add_argument("--workloads", default="steady,burst,storm", help="Comma-separated: steady, burst, storm")
+    parser.add_argument("--rate", type=float, default=5, help="steady: alerts per second")
+    parser.add_argument("--duration", type=float, default=30, help="steady: seconds")
+    parser.add_argument("--burst-size", type=int, default=50)
+    parser.add_argument("--bursts", type=int, default=3)
+    parser.add_argument("--burst-interval", type=float, default=10, help="Seconds between bursts")
+    parser.add_argument("--storm-alerts", type=int, default=500)
+    parser.add_argument("--storm-signatures", type=int, default=10, help="Distinct incidents in the storm")
+    parser.add_argument("--storm-seconds", type=float, default=10)
+    parser.add_argument("--connections", type=int, default=100, help="Concurrent HTTP connections to the API")
+    parser.add_argument("--worker-processes", type=int, default=1)
+    parser.add_argument("--llm-latency-ms", type=float, default=300, help="Scripted base latency per LLM call")
+    parser.add_argument("--llm-jitter-ms", type=float, default=100)
+    parser.add_argument("--ms-per-1k-tokens", type=float, default=50, help="Scripted latency per 1K prompt tokens")
+    parser.add_argument("--log-minutes", type=int, default=30, help="Length of each synthetic service log")
+    parser.add_argument("--lines-per-second", type=int, default=20)
+    parser.add_argument("--temporal-address", help="Use a running Temporal server instead of starting one")
+    parser.add_argument("--temporal-cli", default="temporal")
+    parser.add_argument("--timeout", type=float, default=300, help="Seconds to wait for a workload's summaries")
+    parser.add_argument("--startup-timeout", type=float, default=120)
+    parser.add_argument("--output", help="Write results as JSON here")
+    parser.add_argument("--compare", help="A previous --output file to compare against")
+    parser.add_argument("--max-regression", type=float, default=10,
+                        help="With --compare: exit 1 if a percentile got this many percent slower")
+    parser.add_argument("--keep", action="store_true", help="Keep the temp dir (process logs, incident store)")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    if not args.db:
+        parser.error("--db (or BENCH_DB_CONNECTION) is required: the worker's runbook search needs pgvector")
+    sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
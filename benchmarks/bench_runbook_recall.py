@@ -0,0 +1,108 @@
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+import psycopg
+from pgvector.psycopg import register_vector
+from dotenv import load_dotenv
+
+# Allow "python benchmarks/bench_runbook_recall.py" from the repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.db import RUNBOOK_INDEX_TYPE, vector_index_ddl, vector_search_settings
+
+# --- BENCHMARK: ANN vs. exact runbook retrieval ---
+# Loads synthetic 768-d vectors into a scratch table, builds the same ANN index
+# ingest.py builds, then compares top-k results and latency against an exact
+# (sequential scan) search. Tune with RUNBOOK_INDEX_TYPE, HNSW_*, IVFFLAT_*.
+
+BENCH_TABLE = "runbook_chunks_bench"
+SERVICES = ["auth-service", "payment-service", "frontend-app", None]
+
+
+def percentile(values, p):
+    return float(np.percentile(values, p)) * 1000 if values else 0.0
+
+
+def load_table(conn, rows, dim, rng):
+    print(f"--- 🧪 Loading {rows:,} synthetic chunks into {BENCH_TABLE} ... ---")
+    conn.execute(f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+    conn.execute(f"""
+        CREATE TABLE {BENCH_TABLE} (
+            id bigserial PRIMARY KEY,
+            content text,
+            embedding vector({dim}),
+            service text
+        )
+    """)
+    vectors = rng.standard_normal((rows, dim)).astype(np.float32)
+    with conn.cursor() as cur:
+        with cur.copy(f"COPY {BENCH_TABLE} (content, embedding, service) FROM STDIN WITH (FORMAT BINARY)") as copy:
+            copy.set_types(["text", "vector", "text"])
+            for i, vector in enumerate(vectors):
+                copy.write_row([f"chunk {i}", vector, SERVICES[i % len(SERVICES)]])
+
+    print(f"--- 🏗️ Building {RUNBOOK_INDEX_TYPE} index ... ---")
+    started = time.perf_counter()
+    conn.execute(vector_index_ddl(BENCH_TABLE))
+    conn.execute(f"CREATE INDEX IF NOT EXISTS {BENCH_TABLE}_service_idx ON {BENCH_TABLE} (service)")
+    conn.execute(f"ANALYZE {BENCH_TABLE}")
+    print(f"   index built in {time.perf_counter() - started:.1f}s")
+
+
+def run_queries(conn, queries, top_k, service, exact):
+    conn.execute(f"SET enable_indexscan = {'off' if exact else 'on'}")
+    results, latencies = [], []
+    for query in queries:
+        started = time.perf_counter()
+        rows = conn.execute(
+            f"""
+            SELECT id FROM {BENCH_TABLE}
+            WHERE %(service)s::text IS NULL OR service = %(service)s OR service IS NULL
+            ORDER BY embedding <=> %(vector)s
+            LIMIT %(top_k)s
+            """,
+            {"vector": query, "service": service, "top_k": top_k},
+        ).fetchall()
+        latencies.append(time.perf_counter() - started)
+        results.append({row[0] for row in rows})
+    return results, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall/latency of the runbook ANN index vs. exact search.")
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--service", default="auth-service", help="Service filter ('' for none).")
+    parser.add_argument("--reuse", action="store_true", help="Reuse the existing scratch table.")
+    args = parser.parse_args()
+
+    load_dotenv()
+    rng = np.random.default_rng(42)
+    service = args.service or None
+
+    with psycopg.connect(os.environ.get("DB_CONNECTION"), autocommit=True) as conn:
+        conn.execute("CREATE EXTENSION IF NOT EXISTS vector")
+        register_vector(conn)
+        if not args.reuse:
+            load_table(conn, args.rows, args.dim, rng)
+        for statement in vector_search_settings():
+            conn.execute(statement)
+
+        queries = rng.standard_normal((args.queries, args.dim)).astype(np.float32)
+        exact, exact_latency = run_queries(conn, queries, args.top_k, service, exact=True)
+        approx, approx_latency = run_queries(conn, queries, args.top_k, service, exact=False)
+
+    recall = np.mean([len(a & e) / max(len(e), 1) for a, e in zip(approx, exact)])
+    print(f"--- 📊 {RUNBOOK_INDEX_TYPE}, top-{args.top_k}, service={service} ---")
+    print(f"   recall@{args.top_k}: {recall:.3f}")
+    print(f"   exact  p50 {percentile(exact_latency, 50):7.2f} ms   p95 {percentile(exact_latency, 95):7.2f} ms")
+    print(f"   ann    p50 {percentile(approx_latency, 50):7.2f} ms   p95 {percentile(approx_latency, 95):7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+import os
+import sys
+import time
+import argparse
+import datetime
+import tempfile
+
+# Allow "python benchmarks/bench_timestamps.py" from the repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.log_index import _line_epoch, _slow_line_epoch
+
+# --- MICRO-BENCHMARK: log line timestamp parsing ---
+# Compares the original per-line parse (split on 'Z' + datetime.fromisoformat)
+# with the fixed-prefix fast path in src/log_index.py, over a synthetic log.
+
+
+def legacy_parse(line):
+    """
+    The parse search_logs used to do for every candidate line.
+    """
+    try:
+        log_timestamp_str = line.split('Z')[0]
+        return datetime.datetime.fromisoformat(log_timestamp_str + '+00:00')
+    except (ValueError, IndexError):
+        return None
+
+
+def write_synthetic_log(path, n_lines):
+    print(f"--- 🧪 Writing {n_lines:,} synthetic log lines to {path} ... ---")
+    start = datetime.datetime(2025, 10, 21, tzinfo=datetime.timezone.utc)
+    messages = [
+        "INFO: User login successful for user 'test_user'",
+        "ERROR: NullPointerException at com.example.AuthService:123",
+        "WARN: High CPU load detected: 96%",
+        "ERROR: Database connection failed.",
+    ]
+    with open(path, "w") as f:
+        batch = []
+        for i in range(n_lines):
+            # ~20 lines per second of log time
+            timestamp = (start + datetime.timedelta(seconds=i // 20)).strftime("%Y-%m-%dT%H:%M:%SZ")
+            batch.append(f"{timestamp} {messages[i % len(messages)]}\n")
+            if len(batch) == 100000:
+                f.writelines(batch)
+                batch = []
+        f.writelines(batch)
+
+
+def bench(label, path, mode, parse):
+    started = time.perf_counter()
+    parsed = 0
+    with open(path, mode) as f:
+        for line in f:
+            if parse(line) is not None:
+                parsed += 1
+    elapsed = time.perf_counter() - started
+    print(f"   {label:<28} {parsed:>12,} lines  {elapsed:8.2f}s  {parsed / elapsed:>14,.0f} lines/sec")
+    return parsed / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark log timestamp parsing.")
+    parser.add_argument("--lines", type=int, default=10_000_000, help="Number of synthetic log lines.")
+    parser.add_argument("--log-file", help="Reuse an existing log file instead of generating one.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.log_file
+        if not path:
+            path = os.path.join(tmp, "synthetic.log")
+            write_synthetic_log(path, args.lines)
+
+        print("--- ⏱️ Parsing every line ---")
+        before = bench("before (fromisoformat)", path, "r", legacy_parse)
+        bench("general parser (bytes)", path, "rb", _slow_line_epoch)
+        after = bench("after (fast prefix path)", path, "rb", _line_epoch)
+        print(f"--- 🚀 Speed-up: {after / before:.1f}x ---")
+
+
+if __name__ == "__main__":
+    main()
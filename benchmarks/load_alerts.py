@@ -0,0 +1,96 @@
+import json
+import time
+import random
+import asyncio
+import argparse
+
+import httpx
+
+# --- LOAD GENERATOR: batch alert ingestion ---
+# Fires batches of alerts at /webhook/alerts at a target rate, honours 429 +
+# Retry-After, and reports the sustained accepted alerts/sec.
+#
+#   python benchmarks/load_alerts.py --rate 2000 --batch-size 100 --duration 30
+
+SERVICES = ["auth-service", "payment-service", "frontend-app"]
+ERRORS = ["High CPU Utilization", "Database Connection Timeout", "500 Internal Server Error"]
+
+
+def make_batch(size, unique):
+    now = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    batch = []
+    for _ in range(size):
+        error = random.choice(ERRORS)
+        if unique:
+            error = f"{error} #{random.randrange(1_000_000)}"  # Defeat coalescing
+        batch.append({"timestamp": now, "service": random.choice(SERVICES), "error_message": error})
+    return batch
+
+
+async def sender(client, args, stats, deadline, interval):
+    while time.monotonic() < deadline:
+        started = time.monotonic()
+        batch = make_batch(args.batch_size, args.unique)
+        if args.ndjson:
+            body = "\n".join(json.dumps(alert) for alert in batch)
+            headers = {"content-type": "application/x-ndjson"}
+        else:
+            body = json.dumps(batch)
+            headers = {"content-type": "application/json"}
+
+        try:
+            response = await client.post(f"{args.url}/webhook/alerts", content=body, headers=headers)
+        except httpx.HTTPError as e:
+            stats["errors"] += 1
+            print(f"--- ❌ Load: {e} ---")
+            await asyncio.sleep(1)
+            continue
+
+        stats["latencies"].append(time.monotonic() - started)
+        if response.status_code == 202:
+            stats["accepted"] += len(batch)
+        elif response.status_code == 429:
+            stats["rejected"] += len(batch)
+            await asyncio.sleep(float(response.headers.get("Retry-After", 1)))
+            continue
+        else:
+            stats["errors"] += 1
+
+        await asyncio.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Load test the batch alert endpoint.")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--rate", type=float, default=1000, help="Target alerts/sec.")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8, help="Parallel senders.")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds.")
+    parser.add_argument("--ndjson", action="store_true", help="Send NDJSON instead of a JSON array.")
+    parser.add_argument("--unique", action="store_true", help="Make every alert a distinct incident.")
+    args = parser.parse_args()
+
+    stats = {"accepted": 0, "rejected": 0, "errors": 0, "latencies": []}
+    # Each sender sends one batch every `interval` seconds
+    interval = args.batch_size * args.concurrency / args.rate
+    deadline = time.monotonic() + args.duration
+
+    print(f"--- 🔥 Load: {args.rate:.0f} alerts/s in batches of {args.batch_size} for {args.duration:.0f}s ---")
+    async with httpx.AsyncClient(timeout=30, limits=httpx.Limits(max_connections=args.concurrency)) as client:
+        started = time.monotonic()
+        await asyncio.gather(*(sender(client, args, stats, deadline, interval) for _ in range(args.concurrency)))
+        elapsed = time.monotonic() - started
+        metrics = (await client.get(f"{args.url}/metrics/alert-queue")).json()
+
+    latencies = sorted(stats["latencies"]) or [0.0]
+    print("--- 📊 Results ---")
+    print(f"   accepted      {stats['accepted']:>10,}  ({stats['accepted'] / elapsed:,.0f} alerts/s sustained)")
+    print(f"   rejected(429) {stats['rejected']:>10,}")
+    print(f"   errors        {stats['errors']:>10,}")
+    print(f"   request p50   {latencies[len(latencies) // 2] * 1000:>10.1f} ms")
+    print(f"   request p95   {latencies[int(len(latencies) * 0.95)] * 1000:>10.1f} ms")
+    print(f"   server queue  {json.dumps(metrics)}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,79 @@
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# --- LOCAL SLACK WEBHOOK STUB ---
+# Accepts incoming-webhook posts and prints them, with optional latency, rate
+# limiting (429 + Retry-After) and random 5xx errors, to exercise the notification
+# dispatcher without a real Slack workspace.
+#
+#   python benchmarks/slack_stub.py --port 8099 --latency-ms 300 --rate-per-second 1 --error-rate 0.1
+#   SLACK_WEBHOOK_URL=http://127.0.0.1:8099/hook python worker.py
+
+
+def make_handler(args):
+    lock = threading.Lock()
+    last_accepted = [0.0]
+    stats = {"posts": 0, "messages": 0, "rate_limited": 0, "errors": 0}
+
+    class SlackStubHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            time.sleep(args.latency_ms / 1000)
+
+            with lock:
+                now = time.monotonic()
+                if args.rate_per_second and now - last_accepted[0] < 1 / args.rate_per_second:
+                    stats["rate_limited"] += 1
+                    return self._reply(429, "rate_limited", {"Retry-After": "1"})
+                if random.random() < args.error_rate:
+                    stats["errors"] += 1
+                    return self._reply(500, "internal_error")
+                last_accepted[0] = now
+                stats["posts"] += 1
+
+            text = json.loads(body or b"{}").get("text", "")
+            # The dispatcher joins coalesced messages with this separator
+            stats["messages"] += text.count("\n\n───\n\n") + 1
+            print(f"--- 📨 Slack stub: post #{stats['posts']} ({len(text)} chars) {json.dumps(stats)} ---")
+            if args.verbose:
+                print(text)
+            self._reply(200, "ok")
+
+        def _reply(self, status, text, headers=None):
+            self.send_response(status)
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.send_header("Content-Type", "text/plain")
+            self.send_header("Content-Length", str(len(text)))
+            self.end_headers()
+            self.wfile.write(text.encode())
+
+        def log_message(self, format, *log_args):
+            pass  # The summary line above is enough
+
+    return SlackStubHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for a Slack incoming webhook.")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--rate-per-second", type=float, default=1, help="Accepted posts/sec; 0 disables the limit")
+    parser.add_argument("--error-rate", type=float, default=0, help="Fraction of posts answered with a 500")
+    parser.add_argument("--verbose", action="store_true", help="Print every message body")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(args))
+    print(f"--- 📨 Slack stub listening on http://127.0.0.1:{args.port}/hook ---")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
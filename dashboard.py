@@ -2,6 +2,7 @@ import streamlit as st
 import requests
 import json
 import time
+from datetime import datetime, timezone
 
 # Configuration
 API_URL = "https://fireline-backend.onrender.com"
@@ -20,7 +21,8 @@ error_msg = st.sidebar.selectbox("Error", ["High CPU Utilization", "Database Con
 if st.sidebar.button("Trigger Incident"):
     # Construct the payload
     payload = {
-        "timestamp": "2025-10-21T03:05:00Z", # Mock timestamp for consistent ID
+        # Now: the workflow ID buckets alerts by time, and a finished bucket is never reopened
+        "timestamp": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
         "service": service_name,
         "error_message": error_msg
     }
@@ -28,7 +30,13 @@ if st.sidebar.button("Trigger Incident"):
     try:
         res = requests.post(f"{API_URL}/webhook/alert", json=payload)
         if res.status_code == 200:
-            st.sidebar.success("Alert Sent! Workflow started.")
+            body = res.json()
+            if body["status"] == "coalesced":
+                st.sidebar.info(f"Alert added to the running incident {body['id']} (x{body['alert_count']}).")
+            elif body["status"] == "incident_closed":
+                st.sidebar.warning(f"Incident {body['id']} is already closed; the alert was not re-investigated.")
+            else:
+                st.sidebar.success("Alert Sent! Workflow started.")
         else:
             st.sidebar.error(f"Failed: {res.text}")
     except Exception as e:
@@ -40,11 +48,42 @@ st.subheader("📋 Active Investigations")
 # Button to refresh the list
 if st.button("Refresh Status"):
     pass # Streamlit reruns the script on click, so this just triggers a reload
+live_updates = st.sidebar.toggle("⚡ Live updates", value=True)
+
+def sync_incidents():
+    """
+    Full load on the first run, then only deltas: incidents (with their summaries)
+    that changed since the last sync. An unchanged list costs one 304.
+    """
+    state = st.session_state
+    if "incidents" not in state:
+        incidents, cursor = {}, None
+        while True:
+            page = requests.get(f"{API_URL}/incidents", params={"limit": 200, "cursor": cursor}).json()
+            incidents.update((inc["id"], inc) for inc in page["incidents"])
+            cursor = page["next_cursor"]
+            if not cursor:
+                break
+        state.incidents, state.since, state.etag = incidents, page["next_since"], None
+        return
+
+    while True:
+        headers = {"If-None-Match": state.etag} if state.etag else {}
+        res = requests.get(f"{API_URL}/incidents", params={"since": state.since, "limit": 200}, headers=headers)
+        if res.status_code == 304:
+            return
+        page = res.json()
+        for incident_id in page.get("removed", []):
+            state.incidents.pop(incident_id, None)  # Archived
+        state.incidents.update((inc["id"], inc) for inc in page["incidents"])
+        state.since, state.etag = page["next_since"], res.headers.get("ETag")
+        if not page["has_more"]:
+            return
 
 try:
-    # Fetch list from API
-    response = requests.get(f"{API_URL}/incidents")
-    incidents = response.json()
+    # Fetch (changes to) the list from the API
+    sync_incidents()
+    incidents = sorted(st.session_state.incidents.values(), key=lambda inc: inc["created_at"], reverse=True)
 
     if not incidents:
         st.info("No active incidents. System healthy.")
@@ -65,18 +104,28 @@ try:
                 st.write(f"**Trigger:** {inc['error']}")
 
             with col_b:
-                # --- NEW: Fetch and Display Live Analysis ---
-                try:
-                    res = requests.get(f"{API_URL}/incident/{inc['id']}/analysis")
-                    analysis_text = res.json().get("analysis", "Loading...")
-                    # Display the AI's findings in a nice box
-                    st.info(f"**🤖 AI Investigator:**\n\n{analysis_text}")
-                except:
-                    st.warning("Could not fetch analysis.")
+                # The latest summary comes inline with the incident list
+                analysis_text = inc.get("summary") or "Investigation in progress..."
+                # Display the AI's findings in a nice box
+                st.info(f"**🤖 AI Investigator:**\n\n{analysis_text}")
+
+                # Intermediate findings while the investigation is still running
+                progress = json.loads(inc["progress"]) if inc.get("progress") else None
+                if progress and not inc.get("summary"):
+                    resumed = f" · resumed after turn {progress['resumed_from_turn']}" if progress.get("resumed_from_turn") else ""
+                    st.caption(f"Turn {progress['turn']}/{progress['max_turns']} · {progress['phase']}{resumed}")
+                    for tool in progress["tools"]:
+                        if "error" in tool:
+                            found = f"⚠️ {tool['error']}"
+                        elif "log_hits" in tool:
+                            found = f"{tool['log_hits']} log message(s)" + (f" — `{tool['top_hit']}`" if tool.get("top_hit") else "")
+                        else:
+                            found = ", ".join(tool.get("runbook_sections", [])) or "no runbook match"
+                        st.caption(f"🛠️ {tool['tool']} ({tool['seconds']:.1f}s): {found}")
 
             with col_c:
                 status = inc['status']
-                if status == "investigating":
+                if status in ("investigating", "awaiting_approval"):
                     if st.button(f"✅ Approve Fix", key=f"btn_{inc['id']}"):
                         res = requests.post(f"{API_URL}/incident/{inc['id']}/approve")
                         if res.status_code == 200:
@@ -86,9 +135,30 @@ try:
                         else:
                             st.error("Failed.")
                 elif status == "approved":
+                    st.info("⏳ Executing Fix...")
+                elif status == "remediated":
                     st.success("🚀 Fix Executed")
+                elif status == "timed_out":
+                    st.warning("⌛ Approval Timed Out")
 
         st.markdown("---")
 
 except Exception as e:
     st.error(f"Could not connect to API Server. Is it running? ({e})")
+    live_updates = False
+
+# --- LIVE UPDATES ---
+# Block on the server's event stream and rerun as soon as anything changes; the
+# rerun's delta sync then fetches just the changed incidents.
+if live_updates:
+    live_status = st.empty()
+    try:
+        # Short keep-alives let Streamlit interrupt this wait when a button is clicked
+        with requests.get(f"{API_URL}/incidents/stream", params={"heartbeat": 1}, stream=True, timeout=30) as stream:
+            for line in stream.iter_lines(decode_unicode=True):
+                if line.startswith("event:"):
+                    break
+                live_status.caption(f"⚡ Live · {time.strftime('%H:%M:%S')}")
+    except requests.RequestException:
+        time.sleep(2)  # API restarting: back off, then reconnect on rerun
+    st.rerun()
@@ -1,16 +1,50 @@
-import uuid
-from fastapi import FastAPI
-from pydantic import BaseModel, Field
-from temporalio.client import Client
+import os
+import json
+import asyncio
+import time
+import base64
+import hashlib
+import datetime
+from fastapi import FastAPI, Request, HTTPException
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field, ValidationError
+from temporalio.client import Client, WorkflowQueryFailedError
+from temporalio.common import WorkflowIDReusePolicy
+from temporalio.exceptions import WorkflowAlreadyStartedError
+from temporalio.service import RPCError, RPCStatusCode
 # We import IncidentWorkflow just to get the signal name, but we start by string
 from src.workflows import IncidentWorkflow
+from src.alert_queue import AlertQueue
+from src.task_queues import WORKFLOW_TASK_QUEUE
+from src.incident_store import get_incident_store, COLUMNS
+from src.event_broker import EventBroker, ChangeFeed, format_sse
+from src.summary_cache import SummaryCache
+from src.investigation_cache import get_investigation_cache
 
 # --- TEMPORAL CLIENT SETUP ---
+TEMPORAL_ADDRESS = os.environ.get("TEMPORAL_ADDRESS", "127.0.0.1:7233")
 temporal_client = None
 
-# --- IN-MEMORY DATABASE (For POC UI) ---
-# In production, this would be a Postgres table.
-active_incidents = {} 
+# --- ALERT COALESCING ---
+# Alerts with the same service and error inside one window belong to one incident.
+# Windows are fixed (tumbling) buckets of the alert timestamp, not sliding: two
+# alerts a few seconds apart on either side of a bucket boundary open two incidents.
+ALERT_COALESCE_WINDOW_SECONDS = int(os.environ.get("ALERT_COALESCE_WINDOW_SECONDS", 300))
+
+# --- INCIDENT STORE ---
+# SQLite locally, Postgres in production (INCIDENT_STORE_URL); shared by every API
+# replica and written through by the workflow.
+ARCHIVE_INTERVAL_SECONDS = 600
+archive_task = None
+
+# --- LIVE UPDATES ---
+# One change feed per API process, fanned out to every /incidents/stream subscriber.
+SSE_HEARTBEAT_SECONDS = 15
+event_broker = EventBroker()
+change_feed_task = None
+
+# Read-through cache for /incident/{id}/analysis (see src/summary_cache.py)
+summary_cache = SummaryCache()
 
 app = FastAPI(
     title="Fireline API",
@@ -28,9 +62,38 @@ app.add_middleware(
 async def startup_event():
     """On API startup, connect to the Temporal server."""
     global temporal_client
-    temporal_client = await Client.connect("127.0.0.1:7233")
+    temporal_client = await Client.connect(TEMPORAL_ADDRESS)
     print("--- 🚀 API: Connected to Temporal server ---")
 
+    # Starter tasks that drain the batch ingestion queue
+    alert_queue.start()
+
+    # Retention: periodically move old closed incidents out of the hot table
+    global archive_task
+    archive_task = asyncio.create_task(archive_closed_incidents())
+
+    # Push incident changes (from this API and from the workflow) to dashboards
+    global change_feed_task
+    change_feed = ChangeFeed(get_incident_store(), event_broker, encode_cursor, safety_seconds=DELTA_SAFETY_SECONDS)
+    change_feed_task = asyncio.create_task(change_feed.run((time.time() - DELTA_SAFETY_SECONDS, "")))
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await alert_queue.stop()
+    for task in (archive_task, change_feed_task):
+        if task:
+            task.cancel()
+
+async def archive_closed_incidents():
+    while True:
+        try:
+            archived = await asyncio.to_thread(get_incident_store().archive_closed)
+            if archived:
+                print(f"--- 🗄️ API: Archived {archived} closed incident(s) ---")
+        except Exception as e:
+            print(f"--- ❌ API: Incident archival failed: {e} ---")
+        await asyncio.sleep(ARCHIVE_INTERVAL_SECONDS)
+
 
 class Alert(BaseModel):
     timestamp: str = Field(..., example="2025-10-21T03:05:00Z")
@@ -42,35 +105,238 @@ def read_root():
     return {"status": "Fireline API is running"}
 
 # --- NEW: Endpoint for UI to fetch incidents ---
+INCIDENT_PAGE_MAX = 500
+# Delta cursors never point at the last few seconds: a write whose updated_at was
+# taken just before ours may not have committed yet. Re-sent rows are harmless
+# because clients upsert by id.
+DELTA_SAFETY_SECONDS = 2.0
+
+def encode_cursor(values) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+def decode_cursor(cursor: str):
+    try:
+        value, incident_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return float(value), str(incident_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+
+def split_param(value):
+    return [item.strip() for item in value.split(",") if item.strip()] if value else None
+
+@app.get("/incidents/stream")
+async def stream_incidents(request: Request, heartbeat: float = SSE_HEARTBEAT_SECONDS):
+    """
+    Server-Sent Events: incident_created, alert_coalesced, summary_updated, awaiting_approval,
+    approved, remediated, timed_out, failed. Each event carries the whole incident
+    (incident_archived carries only its id). Reconnecting
+    with Last-Event-ID first replays everything that changed while disconnected.
+    heartbeat: seconds between keep-alive comments (clients may lower it to notice
+    disconnects sooner).
+    """
+    last_event_id = request.headers.get("last-event-id")
+    replay_since = decode_cursor(last_event_id) if last_event_id else None  # 400 before subscribing
+    subscriber = event_broker.subscribe()  # Before the replay, so nothing falls in between
+    heartbeat = max(0.5, min(heartbeat, SSE_HEARTBEAT_SECONDS))
+
+    async def events():
+        try:
+            since = replay_since
+            while since is not None:
+                rows = await asyncio.to_thread(get_incident_store().list_incidents, None, None, INCIDENT_PAGE_MAX, None, since)
+                for incident in rows[:INCIDENT_PAGE_MAX]:
+                    yield format_sse({"id": encode_cursor((incident["updated_at"], incident["id"])),
+                                      "event": "incident_updated", "data": incident})
+                since = (rows[INCIDENT_PAGE_MAX - 1]["updated_at"], rows[INCIDENT_PAGE_MAX - 1]["id"]) \
+                    if len(rows) > INCIDENT_PAGE_MAX else None
+
+            while not (subscriber.overflowed and subscriber.queue.empty()):
+                try:
+                    event = await asyncio.wait_for(subscriber.queue.get(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keep-alive\n\n"
+                    continue
+                yield format_sse(event)
+        finally:
+            event_broker.unsubscribe(subscriber)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/metrics/events")
+def get_event_metrics():
+    return event_broker.metrics()
+
 @app.get("/incidents")
-def get_incidents():
-    return list(active_incidents.values())
+async def get_incidents(request: Request, status: str = None, service: str = None, fields: str = None,
+                        limit: int = 50, cursor: str = None, since: str = None):
+    """
+    Lists incidents with their latest summary inline (no per-incident analysis call needed).
+      status, service: comma-separated filters
+      fields:          comma-separated columns to return (id is always included)
+      cursor:          next_cursor from the previous page
+      since:           next_since from a previous response; returns only incidents changed after it,
+                       plus "removed": IDs archived since then (apply those before upserting)
+    Supports If-None-Match: an unchanged listing answers 304 after one aggregate query
+    (row count + latest update), without fetching or serialising any incidents.
+    """
+    statuses, services = split_param(status), split_param(service)
+    columns = split_param(fields)
+    if columns:
+        unknown = set(columns) - set(COLUMNS)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+        columns = ["id"] + [column for column in columns if column != "id"]
+    limit = max(1, min(limit, INCIDENT_PAGE_MAX))
+
+    store = get_incident_store()
+    version = await asyncio.to_thread(store.version, statuses, services)
+    etag = 'W/"' + hashlib.sha256(f"{version}|{request.url.query}".encode()).hexdigest()[:32] + '"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+
+    after = decode_cursor(cursor) if cursor else None
+    since_cursor = decode_cursor(since) if since else None
+    rows = await asyncio.to_thread(store.list_incidents, statuses, services, limit, after, since_cursor)
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    body = {"incidents": [{key: row[key] for key in columns} if columns else row for row in rows]}
+    if since_cursor is not None:
+        body["has_more"] = has_more
+        next_since = (rows[-1]["updated_at"], rows[-1]["id"]) if rows else since_cursor
+        if not has_more:
+            next_since = min(next_since, (time.time() - DELTA_SAFETY_SECONDS, ""))
+            next_since = max(next_since, since_cursor)
+        body["removed"] = await asyncio.to_thread(
+            store.archived_between, since_cursor[0], next_since[0], statuses, services
+        )
+        body["next_since"] = encode_cursor(next_since)
+    else:
+        body["next_cursor"] = encode_cursor((rows[-1]["created_at"], rows[-1]["id"])) if has_more else None
+        # Start delta sync from here; the first delta re-sends the last few seconds
+        body["next_since"] = encode_cursor((time.time() - DELTA_SAFETY_SECONDS, ""))
+
+    return JSONResponse(content=body, headers={"ETag": etag})
+
+def incident_workflow_id(alert: Alert) -> str:
+    """
+    Deterministic ID for (service, error_message, time bucket), so repeat alerts
+    map to the workflow that is already investigating them. Buckets are tumbling
+    windows of ALERT_COALESCE_WINDOW_SECONDS.
+    """
+    try:
+        alert_time = datetime.datetime.fromisoformat(alert.timestamp.replace('Z', '+00:00'))
+        bucket = int(alert_time.timestamp()) // ALERT_COALESCE_WINDOW_SECONDS
+    except ValueError:
+        bucket = alert.timestamp  # Unparseable timestamp: only exact repeats coalesce
+
+    key = f"{alert.service}\0{alert.error_message}\0{bucket}"
+    return f"incident-{alert.service}-{hashlib.sha256(key.encode()).hexdigest()[:16]}"
 
 @app.post("/webhook/alert")
 async def post_new_alert(alert: Alert):
     print(f"--- 🚀 API: New alert received for {alert.service} ---")
+    return await submit_alert(alert)
+
+async def submit_alert(alert: Alert):
+    """
+    Starts the incident workflow for an alert, or coalesces it into the running one.
+    """
+    # Same service + error + time bucket -> same workflow ID
+    workflow_id = incident_workflow_id(alert)
+    outcome = await start_or_signal(workflow_id, alert.model_dump())
 
-    # Create a unique ID for this specific run
-    workflow_id = f"incident-{uuid.uuid4()}"
-
-    # Store in our "mock DB" so the UI can see it
-    active_incidents[workflow_id] = {
-        "id": workflow_id,
-        "service": alert.service,
-        "error": alert.error_message,
-        "status": "investigating", # investigating, approved
-        "timestamp": alert.timestamp
-    }
-
-    # Start the workflow
-    await temporal_client.start_workflow(
-        "IncidentWorkflow", # Use string name
-        alert.model_dump(),
-        id=workflow_id,
-        task_queue="fireline-task-queue",
+    if outcome == "closed":
+        print(f"--- 🔁 API: {workflow_id} already finished; alert not re-investigated ---")
+        return {"status": "incident_closed", "id": workflow_id}
+
+    # Store it so the UI (and every other API replica) can see it
+    incident, _ = await asyncio.to_thread(
+        get_incident_store().open_incident,
+        workflow_id, alert.service, alert.error_message, alert.timestamp
     )
 
-    return {"status": "investigation_workflow_started", "id": workflow_id}
+    if outcome == "coalesced":
+        print(f"--- 🔁 API: Coalesced into {workflow_id} (x{incident['alert_count']}) ---")
+        return {"status": "coalesced", "id": workflow_id, "alert_count": incident["alert_count"]}
+
+    return {"status": "investigation_workflow_started", "id": workflow_id, "alert_count": incident["alert_count"]}
+
+async def start_or_signal(workflow_id, alert):
+    """
+    Delivers an alert to its incident's workflow. Returns what happened:
+      "coalesced": the workflow was running and got the alert_received signal
+      "started":   a new run was started (the first alert, or a retry of a failed run)
+      "closed":    the workflow already completed for this bucket; nothing was started
+    Runs that completed are never restarted for the same ID (ALLOW_DUPLICATE_FAILED_ONLY);
+    runs that failed, timed out or were terminated are.
+    """
+    handle = temporal_client.get_workflow_handle(workflow_id)
+    for _ in range(2):
+        # Most alerts in a storm are repeats: try the signal first
+        try:
+            await handle.signal("alert_received", alert)
+            return "coalesced"
+        except RPCError as e:
+            if e.status != RPCStatusCode.NOT_FOUND:
+                raise  # NOT_FOUND: no run, or it has finished
+
+        try:
+            await temporal_client.start_workflow(
+                "IncidentWorkflow", # Use string name
+                alert,
+                id=workflow_id,
+                task_queue=WORKFLOW_TASK_QUEUE,
+                id_reuse_policy=WorkflowIDReusePolicy.ALLOW_DUPLICATE_FAILED_ONLY,
+            )
+            return "started"
+        except WorkflowAlreadyStartedError:
+            pass  # Another replica started it just now (signal it instead), or it completed
+    return "closed"
+
+# --- BATCH INGESTION ---
+alert_queue = AlertQueue(submit_alert)
+
+@app.post("/webhook/alerts")
+async def post_alert_batch(request: Request):
+    """
+    Accepts a JSON array of alerts or NDJSON (one alert per line). Alerts are queued
+    and started by a pool of starters; a full queue answers 429 with Retry-After.
+    """
+    body = await request.body()
+    try:
+        if request.headers.get("content-type", "").startswith("application/x-ndjson"):
+            raw_alerts = [json.loads(line) for line in body.splitlines() if line.strip()]
+        else:
+            raw_alerts = json.loads(body)
+            if isinstance(raw_alerts, dict):
+                raw_alerts = [raw_alerts]
+            elif not isinstance(raw_alerts, list):
+                raise ValueError("expected a JSON array of alerts or a single alert object")
+        alerts = [Alert.model_validate(raw) for raw in raw_alerts]
+    except (ValueError, ValidationError) as e:
+        raise HTTPException(status_code=422, detail=f"Invalid alert batch: {e}")
+
+    if len(alerts) > alert_queue.maxsize:
+        raise HTTPException(status_code=413, detail=f"Batch of {len(alerts)} exceeds queue capacity {alert_queue.maxsize}.")
+
+    if not alert_queue.offer(alerts):
+        retry_after = alert_queue.retry_after_seconds(len(alerts))
+        print(f"--- 🛑 API: Alert queue full, rejecting batch of {len(alerts)} (retry in {retry_after}s) ---")
+        return JSONResponse(
+            status_code=429,
+            content={"status": "queue_full", "retry_after_seconds": retry_after, **alert_queue.metrics()},
+            headers={"Retry-After": str(retry_after)},
+        )
+
+    return JSONResponse(status_code=202, content={"status": "queued", "accepted": len(alerts), **alert_queue.metrics()})
+
+@app.get("/metrics/alert-queue")
+def get_alert_queue_metrics():
+    return alert_queue.metrics()
 
 @app.post("/incident/{workflow_id}/approve")
 async def approve_incident(workflow_id: str):
@@ -85,20 +351,45 @@ async def approve_incident(workflow_id: str):
     # Send the signal. We use the method name from the class as the signal name.
     await handle.signal(IncidentWorkflow.approve_action)
 
-    # Update our mock DB
-    if workflow_id in active_incidents:
-        active_incidents[workflow_id]["status"] = "approved"
+    # Update the incident store
+    await asyncio.to_thread(get_incident_store().update, workflow_id, status="approved")
 
     return {"status": "approved", "workflow_id": workflow_id}
 @app.get("/incident/{workflow_id}/analysis")
 async def get_incident_analysis(workflow_id: str):
     """
-    Queries the running workflow to get the AI's investigation summary.
+    Returns the workflow's investigation summary. Temporal is only queried when the
+    workflow has recorded a summary_version newer than the cached one.
     """
+    # Cheap, indexed: which summary_version has the workflow recorded?
+    version = await asyncio.to_thread(get_incident_store().summary_version, workflow_id)
+    cached = summary_cache.get(workflow_id, version)
+    if cached is not None:
+        return {"analysis": cached, "version": version, "cached": True}
+
     try:
         handle = temporal_client.get_workflow_handle(workflow_id)
-        # Query the workflow for the 'get_current_summary' method
-        summary = await handle.query(IncidentWorkflow.get_current_summary)
-        return {"analysis": summary}
-    except Exception as e:
-        return {"analysis": "Waiting for investigation..."}
+        started = time.perf_counter()
+        state = await handle.query(IncidentWorkflow.get_summary_state)
+        summary_cache.record_query((time.perf_counter() - started) * 1000)
+    except RPCError as e:
+        if e.status == RPCStatusCode.NOT_FOUND:
+            raise HTTPException(status_code=404, detail=f"Workflow {workflow_id} not found.")
+        print(f"--- ❌ API: Summary query failed for {workflow_id}: {e} ---")
+        raise HTTPException(status_code=503, detail="Workflow query failed.")
+    except WorkflowQueryFailedError as e:
+        # e.g. the worker hasn't registered the workflow yet
+        print(f"--- ❌ API: Summary query failed for {workflow_id}: {e} ---")
+        return {"analysis": "Waiting for investigation...", "version": None, "cached": False}
+
+    summary_cache.put(workflow_id, state["version"], state["summary"])
+    return {"analysis": state["summary"], "version": state["version"], "cached": False}
+
+@app.get("/metrics/investigation-cache")
+async def get_investigation_cache_metrics():
+    # Shared with the workers through the cache's SQLite file (same host)
+    return await asyncio.to_thread(get_investigation_cache().stats)
+
+@app.get("/metrics/summary-cache")
+def get_summary_cache_metrics():
+    return summary_cache.stats()
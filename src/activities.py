@@ -1,36 +1,35 @@
-import os
 import json
-import google.generativeai as genai
+import time
 from dotenv import load_dotenv
 from temporalio import activity
 import asyncio
 
 # Import our local tools
-from src.tools import search_logs, search_runbooks
-from src.notifications import post_to_slack
+from src.tools import search_logs, search_runbooks, runbook_corpus_version
+from src.notifications import get_notification_dispatcher, format_summary
+from src.llm import get_llm_provider, PREFETCHED_EVIDENCE_HEADER
+from src.tool_executor import get_tool_executor, ToolTimeoutError, heartbeat_details, TOOL_HEARTBEAT_SECONDS
+from src.incident_store import get_incident_store
+from src.investigation_cache import get_investigation_cache, evidence_digest, fingerprint, llm_cost
+from src.context_budget import ContextBudget, compact_tool_output
 
 # --- 1. SETUP ---
+# The LLM backend (Gemini, OpenAI or the offline scripted stub) is chosen with
+# LLM_PROVIDER and built on first use; see src/llm.py.
 load_dotenv()
 
-# --- Setup Google GenAI Client ---
-try:
-    GOOGLE_API_KEY = os.environ.get("GOOGLE_API_KEY")
-    if not GOOGLE_API_KEY:
-        raise ValueError("GOOGLE_API_KEY not found. Did you set it in the .env file?")
-    genai.configure(api_key=GOOGLE_API_KEY)
-except Exception as e:
-    activity.logger.error(f"Error initializing Google GenAI client: {e}")
-
 # --- 2. DEFINE THE TOOLS ---
 search_logs_tool = {
     "name": "search_logs",
-    "description": "Searches a log file for ERROR lines within a time window around a specific timestamp.",
+    "description": "Searches a log file for ERROR lines within a time window around a specific timestamp. Repeated messages are collapsed with a count.",
     "parameters": {
         "type": "OBJECT",
         "properties": {
             "timestamp_str": { "type": "STRING", "description": "The ISO 8601 timestamp string." },
             # We hide the log_file parameter so the AI stops guessing it
-            "time_window_seconds": { "type": "INTEGER", "description": "The total number of seconds for the search window." }
+            "time_window_seconds": { "type": "INTEGER", "description": "The total number of seconds for the search window." },
+            "levels": { "type": "ARRAY", "items": { "type": "STRING" }, "description": "Severity levels to include (default ['ERROR'], e.g. ['ERROR', 'WARN'])." },
+            "pattern": { "type": "STRING", "description": "Optional regular expression the log line must match." }
         },
         "required": ["timestamp_str"] 
     }
@@ -38,11 +37,12 @@ search_logs_tool = {
 
 search_runbooks_tool = {
     "name": "search_runbooks",
-    "description": "Searches the runbook database for known fixes and remediation steps.",
+    "description": "Searches the runbook database for known fixes and remediation steps. Returns the best matching sections with similarity scores.",
     "parameters": {
         "type": "OBJECT",
         "properties": {
-            "query_text": { "type": "STRING", "description": "The error message or symptom to search for (e.g. 'High CPU', 'NullPointerException')." }
+            "query_text": { "type": "STRING", "description": "The error message or symptom to search for (e.g. 'High CPU', 'NullPointerException')." },
+            "top_k": { "type": "INTEGER", "description": "How many runbook sections to return (default 3)." }
         },
         "required": ["query_text"]
     }
@@ -57,21 +57,23 @@ Your goal is to:
 3. REPORT the specific commands to fix it.
 
 Process:
-- Start by searching logs around the alert time.
+- The alert arrives with the ERROR logs around the alert time and the best-matching runbook sections already attached.
+- Use the tools only for follow-up questions: a wider time window, other levels, a pattern, or a different runbook query.
+- You may call several tools in one response (e.g. `search_logs` and `search_runbooks`); they run in parallel.
 - Analyze the log errors.
-- IF you find a specific error, call the `search_runbooks` tool to find a fix.
-- Once you have the fix, provide a final summary.
+- IF the attached runbooks don't cover the specific error you find, call the `search_runbooks` tool for it.
+- Once you have the fix, provide a final summary. If the attached evidence is enough, answer right away.
 """
 
-# --- 4. CREATE THE MODEL ---
-model = genai.GenerativeModel(
-    model_name='models/gemini-pro-latest',
-    system_instruction=SYSTEM_PROMPT,
-    tools=[search_logs_tool, search_runbooks_tool]
-)
+AGENT_TOOLS = [search_logs_tool, search_runbooks_tool]
+
+MAX_TURNS = 5
+# Tool results kept in the resume checkpoint are truncated to this many characters
+# each, so heartbeat details stay well under Temporal's payload limits.
+CHECKPOINT_RESULT_CHARS = 4000
 
 
-# --- 5. THE ACTIVITY DEFINITIONS ---
+# --- 4. THE ACTIVITY DEFINITIONS ---
 
 @activity.defn
 async def execute_remediation(command: str) -> str:
@@ -89,69 +91,357 @@ async def execute_remediation(command: str) -> str:
     return result
 
 @activity.defn
-async def run_investigation(alert: dict) -> str:
+async def send_notification(notification: dict) -> bool:
+    """
+    Delivers one notification ({"text", "title"?, "channel"?}) through the worker's
+    dispatcher, which coalesces and rate-limits per channel and retries with backoff.
+    The workflow starts this without waiting on it, so a slow Slack never delays
+    the investigation.
+    """
+    text = format_summary(notification["text"], notification.get("title", "Fireline Investigation Complete"))
+    return await get_notification_dispatcher().send(text, channel=notification.get("channel"))
+
+@activity.defn
+async def record_incident(update: dict) -> None:
+    """
+    Writes workflow lifecycle changes (status, summary) through to the incident store.
+    """
+    await asyncio.to_thread(
+        get_incident_store().update,
+        update["id"],
+        **{key: value for key, value in update.items() if key != "id"}
+    )
+
+async def execute_tool(function_name, function_args, alert):
+    """
+    Runs one tool call requested by the agent and returns its JSON-encoded result.
+    Tools run through the tool executor: blocking ones on its thread pool, all of
+    them with per-tool concurrency limits and timeouts.
+    """
+    try:
+        return await _execute_tool(function_name, function_args, alert)
+    except ToolTimeoutError as e:
+        activity.logger.error(f"--- ⏱️ Tool timed out: {e} ---")
+        return json.dumps({"error": str(e)})
+
+async def _execute_tool(function_name, function_args, alert):
+    executor = get_tool_executor()
+
+    if function_name == "search_logs":
+        # FIX 1: We resolve the log segments from the alert's service.
+        # We do not trust the AI to guess the path.
+        tool_output = await executor.run(
+            "search_logs",
+            search_logs,
+            timestamp_str=function_args.get("timestamp_str"),
+            service=alert['service'],
+            time_window_seconds=function_args.get("time_window_seconds", 60),
+            levels=list(function_args.get("levels") or ["ERROR"]),
+            pattern=function_args.get("pattern")
+        )
+        return json.dumps(tool_output)
+
+    if function_name == "search_runbooks":
+        query_text = function_args.get("query_text")
+        # Runbooks are filtered to the alert's service, like the logs.
+        tool_output = await executor.run_async(
+            "search_runbooks",
+            search_runbooks,
+            query_text,
+            service=alert['service'],
+            top_k=int(function_args.get("top_k", 3))
+        )
+        return json.dumps(tool_output)
+
+    activity.logger.error(f"Unknown tool: {function_name}")
+    return json.dumps({"error": "Unknown tool"})
+
+async def timed_tool(call, alert):
+    started = time.perf_counter()
+    output = await execute_tool(call.name, call.args, alert)
+    return output, time.perf_counter() - started
+
+def tool_progress(call, output, seconds):
+    """
+    What an operator wants to see about one tool call: how long it took and what it found.
+    """
+    entry = {"tool": call.name, "seconds": round(seconds, 3)}
+    result = json.loads(output)
+    if isinstance(result, dict) and "error" in result:
+        entry["error"] = result["error"]
+    elif call.name == "search_logs" and isinstance(result, list):
+        entry["log_hits"] = sum(1 for line in result if not line.startswith("... "))
+        entry["top_hit"] = result[0] if result else None
+    elif call.name == "search_runbooks" and isinstance(result, list):
+        entry["runbook_sections"] = [f"{hit['source']} › {hit['section']}" for hit in result]
+    return entry
+
+def resume_prompt(user_prompt, findings):
+    """
+    A retried attempt starts a fresh LLM session; it gets the earlier tool results
+    up front instead of re-running them.
+    """
+    lines = [user_prompt, "", "This investigation was interrupted and resumed. Tool results gathered so far:"]
+    for finding in findings:
+        lines.append(f"- {finding['tool']}({json.dumps(finding['args'])}): {finding['result']}")
+    lines.append("Continue from here; only repeat a tool call if you need different arguments.")
+    return "\n".join(lines)
+
+class InvestigationProgress:
+    """
+    Per-turn progress, heartbeated together with the resume checkpoint and written to
+    the incident store (where the change feed pushes it to dashboards).
+    """
+
+    def __init__(self, workflow_id, checkpoint):
+        self.workflow_id = workflow_id
+        self.turns_completed = checkpoint.get("turns_completed", 0)
+        self.findings = checkpoint.get("findings", [])  # [{turn, tool, args, result}]
+        self.tools = checkpoint.get("tools", [])  # tool_progress() entries
+        self.resumed_from_turn = self.turns_completed or None
+        self.details = None  # Last published heartbeat details
+
+    def record_turn(self, turn, tool_results, sent_results, seconds):
+        """
+        tool_results are the raw outputs (for progress); sent_results what the LLM got.
+        """
+        self.turns_completed = turn
+        for (call, output), (_, sent), elapsed in zip(tool_results, sent_results, seconds):
+            self.findings.append({"turn": turn, "tool": call.name, "args": call.args,
+                                  "result": sent[:CHECKPOINT_RESULT_CHARS]})
+            self.tools.append({"turn": turn, **tool_progress(call, output, elapsed)})
+
+    def checkpoint(self):
+        return {"turns_completed": self.turns_completed, "findings": self.findings, "tools": self.tools}
+
+    def snapshot(self, phase):
+        return {
+            "phase": phase,
+            "turn": self.turns_completed,
+            "max_turns": MAX_TURNS,
+            "tools": self.tools,
+            "resumed_from_turn": self.resumed_from_turn,
+            "attempt": activity.info().attempt,
+        }
+
+    async def publish(self, phase):
+        details = {"checkpoint": self.checkpoint(), "progress": self.snapshot(phase)}
+        self.details = details
+        heartbeat_details.set(details)
+        activity.heartbeat(details)
+        try:
+            await asyncio.to_thread(
+                get_incident_store().update, self.workflow_id, progress=json.dumps(details["progress"])
+            )
+        except Exception as e:
+            # Progress is best effort; it must never fail the investigation
+            activity.logger.warning(f"--- ⚠️ Could not record progress: {e} ---")
+
+    async def keep_alive(self, interval=TOOL_HEARTBEAT_SECONDS):
+        """
+        Heartbeats the latest details for as long as the activity runs, so a slow LLM
+        turn isn't mistaken for a hung worker (and the checkpoint is never lost).
+        """
+        while True:
+            await asyncio.sleep(interval)
+            activity.heartbeat(self.details or {"checkpoint": self.checkpoint()})
+
+async def fetch_alert_logs(alert):
+    """
+    ERROR lines in the minute around the alert, from every log segment of its service.
+    None if the alert's timestamp can't be parsed (there is no window to search).
+    """
+    try:
+        return await get_tool_executor().run(
+            "search_logs", search_logs, timestamp_str=alert["timestamp"], service=alert["service"]
+        )
+    except ValueError as e:
+        activity.logger.warning(f"--- ⚠️ No log pre-fetch for timestamp {alert['timestamp']!r}: {e} ---")
+        return None
+
+async def fetch_alert_runbooks(alert):
+    """
+    The best runbook sections for the alert's error, and the corpus version they came from.
+    """
+    hits, corpus_version = await asyncio.gather(
+        get_tool_executor().run_async("search_runbooks", search_runbooks, alert["error_message"],
+                                      service=alert["service"]),
+        runbook_corpus_version(),
+    )
+    return {"hits": hits, "corpus_version": corpus_version}
+
+@activity.defn
+async def prefetch_logs(alert: dict) -> list:
+    """
+    Pre-fetch stage: the log search every investigation starts with.
+    """
+    return await fetch_alert_logs(alert)
+
+@activity.defn
+async def prefetch_runbooks(alert: dict) -> dict:
+    """
+    Pre-fetch stage: the runbook search every investigation starts with.
+    """
+    return await fetch_alert_runbooks(alert)
+
+async def gather_evidence(alert):
+    """
+    The pre-fetch bundle, for workflows started before the pre-fetch stage existed.
+    A part that fails or times out is left out (None); the agent can still fetch it
+    with its tools.
+    """
+    logs, runbooks = await asyncio.gather(fetch_alert_logs(alert), fetch_alert_runbooks(alert),
+                                          return_exceptions=True)
+    for name, part in (("logs", logs), ("runbooks", runbooks)):
+        if isinstance(part, ToolTimeoutError):
+            activity.logger.warning(f"--- ⏱️ Evidence pre-fetch timed out: {part} ---")
+        elif isinstance(part, asyncio.CancelledError):
+            raise part
+        elif isinstance(part, BaseException):
+            activity.logger.warning(f"--- ⚠️ Pre-fetching {name} failed: {part!r} ---")
+    return {
+        "logs": None if isinstance(logs, BaseException) else logs,
+        "runbooks": None if isinstance(runbooks, BaseException) else runbooks,
+    }
+
+def evidence_prompt(alert, evidence):
+    """
+    The pre-fetched evidence as part of the first message, compacted like tool results.
+    """
+    lines = [PREFETCHED_EVIDENCE_HEADER]
+    if evidence.get("logs") is not None:
+        logs = compact_tool_output("search_logs", evidence["logs"])
+        lines.append(f"search_logs (ERROR lines, 60s around {alert['timestamp']}): {json.dumps(logs)}")
+    if evidence.get("runbooks") is not None:
+        hits = compact_tool_output("search_runbooks", evidence["runbooks"]["hits"])
+        lines.append(f"search_runbooks ({json.dumps(alert['error_message'])}): {json.dumps(hits)}")
+    return "\n".join(lines)
+
+@activity.defn
+async def run_investigation(alert: dict, evidence: dict = None) -> str:
+    """
+    evidence: the workflow's pre-fetch bundle {"logs", "runbooks"}; fetched here if absent.
+    """
     activity.logger.info(f"--- 🔥 Fireline Investigation Started for {alert['service']} ---")
 
-    chat = model.start_chat()
-    user_prompt = f"New Incident Alert: {json.dumps(alert)}"
+    # A retried attempt resumes from the last heartbeat checkpoint
+    previous = activity.info().heartbeat_details
+    checkpoint = (previous[0] or {}).get("checkpoint", {}) if previous else {}
+    progress = InvestigationProgress(activity.info().workflow_id, checkpoint)
+    # Until the first publish, tool heartbeats (e.g. during the evidence pre-fetch) must
+    # carry the restored checkpoint: they add their in-progress marker next to it
+    heartbeat_details.set({"checkpoint": progress.checkpoint()})
+
+    keep_alive = asyncio.create_task(progress.keep_alive())
+    try:
+        return await investigate(alert, evidence, progress)
+    finally:
+        keep_alive.cancel()
+
+async def investigate(alert, evidence, progress):
+    """
+    The body of run_investigation: result cache, then the agent loop.
+    """
+    # --- RESULT CACHE: same alert + same evidence + same runbooks -> same answer ---
+    if evidence is None:
+        evidence = await gather_evidence(alert)
+    cache = get_investigation_cache()
+    # No cache key (None) unless both logs and runbooks were fetched: a failed
+    # pre-fetch must not be cached as "no evidence"
+    corpus_version = (evidence.get("runbooks") or {}).get("corpus_version")
+    cache_key = fingerprint(
+        alert, evidence_digest(evidence.get("logs"), (evidence.get("runbooks") or {}).get("hits")), corpus_version
+    )
+    cached = await asyncio.to_thread(cache.get, cache_key) if cache_key else None
+    if cached:
+        stats = await asyncio.to_thread(cache.stats)
+        activity.logger.info(
+            f"--- ♻️ Result cache hit: reused an analysis from {time.time() - cached['created_at']:.0f}s ago, "
+            f"saving ~${llm_cost(cached['input_tokens'], cached['output_tokens']):.4f} "
+            f"(hit ratio {stats['hit_ratio']:.0%}, ${stats['saved_cost_usd']:.2f} saved in total) ---"
+        )
+        final_summary = (
+            "♻️ Same alert and evidence as a recent investigation; its analysis is reused.\n\n" + cached["summary"]
+        )
+        await progress.publish("cached")
+        return final_summary
+
+    session = get_llm_provider().start_session(SYSTEM_PROMPT, AGENT_TOOLS, alert)
+    # The first message already carries the logs and runbooks every investigation starts with
+    user_prompt = f"New Incident Alert: {json.dumps(alert)}\n\n{evidence_prompt(alert, evidence)}"
+    if progress.findings:
+        activity.logger.info(f"--- ♻️ Resuming after turn {progress.turns_completed} "
+                             f"with {len(progress.findings)} earlier tool result(s) ---")
+        user_prompt = resume_prompt(user_prompt, progress.findings)
+    tool_results = []
+    turn_timings = []  # Per turn: LLM latency, tool latency, tools run and tokens
+    input_tokens = output_tokens = 0
+    # Tool outputs are compacted to keep the conversation within its token budget
+    budget = ContextBudget()
+    budget.add_prompt(SYSTEM_PROMPT + user_prompt)
+    investigation_started = time.perf_counter()
+    await progress.publish("started")
 
     # --- THE AGENT LOOP (Max 5 Turns) ---
-    for turn in range(5):
+    for turn in range(progress.turns_completed, MAX_TURNS):
         activity.logger.info(f"--- 🔄 Turn {turn + 1}: Asking LLM... ---")
 
         try:
-            # Send message (user prompt on first turn, empty on subsequent turns)
-            response = await chat.send_message_async(user_prompt if turn == 0 else [])
-            response_message = response.candidates[0].content
+            # Send message (user prompt on this attempt's first turn, tool results afterwards)
+            llm_started = time.perf_counter()
+            if not tool_results:
+                response = await session.send(user_prompt)
+            else:
+                response = await session.send_tool_results(tool_results)
+            timing = {"turn": turn + 1, "llm_seconds": round(time.perf_counter() - llm_started, 3)}
+            turn_timings.append(timing)
+            input_tokens += response.input_tokens
+            output_tokens += response.output_tokens
+            budget.add_reply(response)
+            timing["input_tokens"] = response.input_tokens
+            timing["output_tokens"] = response.output_tokens
+            activity.logger.info(
+                f"--- 🧮 Turn {turn + 1}: {response.input_tokens} tokens in, {response.output_tokens} out; "
+                f"~{budget.used_tokens}/{budget.budget_tokens} of the context budget used ---"
+            )
 
             # CHECK: Does the AI want to use a tool?
-            if not response_message.parts[0].function_call:
+            if not response.tool_calls:
                 activity.logger.info("--- 🧠 Agent decided to stop. Finalizing... ---")
-                final_summary = response_message.parts[0].text
-
-                if final_summary:
-                    post_to_slack(final_summary)
-                return final_summary
-
-            # EXECUTE: The AI wants to use a tool
-            function_call = response_message.parts[0].function_call
-            function_name = function_call.name
-            function_args = function_call.args
-
-            activity.logger.info(f"--- 🛠️ Calling Tool: {function_name} ---")
-            tool_result_json = "{}"
-
-            if function_name == "search_logs":
-                # FIX 1: We FORCE the mock file. We do not trust the AI to guess the path.
-                tool_output = search_logs(
-                    timestamp_str=function_args.get("timestamp_str"),
-                    log_file="mock_service.log", 
-                    time_window_seconds=function_args.get("time_window_seconds", 60)
+                final_summary = response.text
+                activity.logger.info(
+                    f"--- ⏱️ Time to summary: {time.perf_counter() - investigation_started:.2f}s "
+                    f"over {len(turn_timings)} LLM round trip(s): {json.dumps(turn_timings)} ---"
+                )
+                activity.logger.info(
+                    f"--- 🧮 Tokens: {input_tokens} in, {output_tokens} out; context {json.dumps(budget.stats())} ---"
                 )
-                tool_result_json = json.dumps(tool_output)
 
-            elif function_name == "search_runbooks":
-                query_text = function_args.get("query_text")
-                tool_output = search_runbooks(query_text)
-                tool_result_json = json.dumps(tool_output)
+                await progress.publish("summarizing")
+                if final_summary and cache_key:
+                    llm_seconds = sum(timing["llm_seconds"] for timing in turn_timings)
+                    await asyncio.to_thread(cache.put, cache_key, final_summary, corpus_version,
+                                            input_tokens, output_tokens, llm_seconds)
+                return final_summary
 
-            else:
-                activity.logger.error(f"Unknown tool: {function_name}")
-                tool_result_json = json.dumps({"error": "Unknown tool"})
+            # EXECUTE: Run every tool the AI asked for in this response, concurrently
+            activity.logger.info(f"--- 🛠️ Calling Tools: {', '.join(call.name for call in response.tool_calls)} ---")
+            tools_started = time.perf_counter()
+            timed_outputs = await asyncio.gather(*(timed_tool(call, alert) for call in response.tool_calls))
+            timing["tool_seconds"] = round(time.perf_counter() - tools_started, 3)
+            timing["tools"] = len(response.tool_calls)
 
-            # RESPOND: Send tool output back to the AI
-            # FIX 2: We use a raw DICTIONARY to avoid import errors
-            response_part = {
-                "function_response": {
-                    "name": function_name,
-                    "response": {"result": tool_result_json}
-                }
-            }
+            # RESPOND: All tool outputs go back to the AI together on the next turn,
+            # compacted to what the remaining context budget allows
+            raw_results = [(call, output) for call, (output, _) in zip(response.tool_calls, timed_outputs)]
+            tool_results = budget.fit_tool_results(raw_results)
 
-            await chat.send_message_async(response_part)
+            # CHECKPOINT: a retry resumes after this turn
+            progress.record_turn(turn + 1, raw_results, tool_results, [elapsed for _, elapsed in timed_outputs])
+            await progress.publish("investigating")
 
         except Exception as e:
             activity.logger.error(f"--- ❌ FATAL ERROR in investigation: {e} ---")
             raise e
 
-    return "Agent reached max turns without resolution."
\ No newline at end of file
+    return "Agent reached max turns without resolution."
@@ -0,0 +1,119 @@
+import os
+import math
+import time
+import asyncio
+from collections import deque
+
+# --- BOUNDED ALERT INGESTION QUEUE ---
+# The batch webhook only enqueues; a fixed pool of starter tasks drains the queue
+# and starts (or signals) workflows. When the queue is full the API answers 429
+# with Retry-After instead of letting requests pile up and time out.
+
+ALERT_QUEUE_SIZE = int(os.environ.get("ALERT_QUEUE_SIZE", 10000))
+ALERT_STARTERS = int(os.environ.get("ALERT_STARTERS", 16))
+# On shutdown, how long to keep starting already-accepted alerts before dropping the rest
+ALERT_DRAIN_SECONDS = float(os.environ.get("ALERT_DRAIN_SECONDS", 20))
+THROUGHPUT_WINDOW_SECONDS = 10
+
+
+class AlertQueue:
+    def __init__(self, handler, maxsize=ALERT_QUEUE_SIZE, starters=ALERT_STARTERS):
+        """
+        handler: async function called with one alert by a starter task.
+        """
+        self.handler = handler
+        self.maxsize = maxsize
+        self.starters = starters
+        self._queue = None
+        self._tasks = []
+        self.draining = False
+        self._started_at = time.monotonic()
+        self._completions = deque(maxlen=100000)  # Recent completion times, for the drain rate
+
+        # Metrics
+        self.enqueued = 0
+        self.processed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.in_flight = 0
+
+    def start(self):
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._started_at = time.monotonic()
+        self._tasks = [asyncio.create_task(self._starter()) for _ in range(self.starters)]
+
+    async def stop(self, drain_seconds=ALERT_DRAIN_SECONDS):
+        """
+        Starts the alerts already accepted (answered 202), for up to drain_seconds,
+        then cancels the starters. Whatever is still queued after that is dropped.
+        """
+        self.draining = True  # Refuse new batches (429) while draining
+        if self._queue is not None and self._tasks:
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout=drain_seconds)
+            except asyncio.TimeoutError:
+                print(f"--- ⚠️ API: Dropping {self._queue.qsize()} queued alert(s) after {drain_seconds:.0f}s drain ---")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def offer(self, alerts):
+        """
+        Enqueues the whole batch, or none of it if it doesn't fit. Returns True if accepted.
+        """
+        if self.draining or self.maxsize - self._queue.qsize() < len(alerts):
+            self.rejected += len(alerts)
+            return False
+        for alert in alerts:
+            self._queue.put_nowait(alert)
+        self.enqueued += len(alerts)
+        return True
+
+    def retry_after_seconds(self, batch_size):
+        """
+        How long until the backlog has drained enough to take a batch this size.
+        """
+        rate = self.throughput()
+        excess = self._queue.qsize() + batch_size - self.maxsize
+        if rate <= 0:
+            return 5
+        return max(1, min(60, math.ceil(max(excess, 1) / rate)))
+
+    def throughput(self):
+        """
+        Alerts/sec processed over the last THROUGHPUT_WINDOW_SECONDS.
+        """
+        now = time.monotonic()
+        while self._completions and self._completions[0] < now - THROUGHPUT_WINDOW_SECONDS:
+            self._completions.popleft()
+        window = min(THROUGHPUT_WINDOW_SECONDS, now - self._started_at)
+        return len(self._completions) / window if window > 0 else 0.0
+
+    def metrics(self):
+        return {
+            "depth": self._queue.qsize() if self._queue else 0,
+            "capacity": self.maxsize,
+            "starters": self.starters,
+            "in_flight": self.in_flight,
+            "enqueued": self.enqueued,
+            "processed": self.processed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "alerts_per_second": round(self.throughput(), 2),
+        }
+
+    async def _starter(self):
+        while True:
+            alert = await self._queue.get()
+            self.in_flight += 1
+            try:
+                await self.handler(alert)
+                self.processed += 1
+                self._completions.append(time.monotonic())
+            except Exception as e:
+                self.failed += 1
+                print(f"--- ❌ API: Failed to start workflow for {alert.service}: {e} ---")
+            finally:
+                self.in_flight -= 1
+                self._queue.task_done()
@@ -0,0 +1,147 @@
+import os
+import re
+
+# --- MARKDOWN-AWARE RUNBOOK CHUNKER ---
+# Keeps each header's section together (so "## High CPU Utilization" stays with its
+# remediation command), prefixes every chunk with its header path, and only splits
+# sections that exceed the token budget - never inside a code block or `command`.
+
+CHUNK_MAX_TOKENS = int(os.environ.get("CHUNK_MAX_TOKENS", 400))
+CHUNK_OVERLAP_TOKENS = int(os.environ.get("CHUNK_OVERLAP_TOKENS", 50))
+
+_HEADER = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$")
+_FENCE = re.compile(r"^\s*(```|~~~)")
+
+
+def estimate_tokens(text):
+    """
+    Cheap token estimate (~4 characters per token for English/Markdown).
+    """
+    return max(1, len(text) // 4) if text else 0
+
+
+def _sections(text):
+    """
+    Yields (header_path, body_lines) for every header section, in document order.
+    """
+    path = []  # [(level, title)]
+    body = []
+    in_fence = False
+
+    for line in text.splitlines():
+        if _FENCE.match(line):
+            in_fence = not in_fence
+        header = None if in_fence else _HEADER.match(line)
+        if header:
+            yield " > ".join(title for _, title in path), body
+            level = len(header.group(1))
+            path = [(l, t) for l, t in path if l < level] + [(level, header.group(2))]
+            body = []
+        else:
+            body.append(line)
+
+    yield " > ".join(title for _, title in path), body
+
+
+def _blocks(lines):
+    """
+    Groups body lines into blocks separated by blank lines. A fenced code block is
+    always one block, even if it contains blank lines.
+    """
+    block = []
+    in_fence = False
+    for line in lines:
+        if _FENCE.match(line):
+            in_fence = not in_fence
+            block.append(line)
+            if not in_fence:
+                yield "\n".join(block)
+                block = []
+            continue
+        if not in_fence and not line.strip():
+            if block:
+                yield "\n".join(block)
+                block = []
+            continue
+        block.append(line)
+    if block:
+        yield "\n".join(block)
+
+
+def _join(units):
+    return "".join(f"{separator}{unit}" if i else unit for i, (separator, unit) in enumerate(units))
+
+
+def _split_block(block, max_tokens, overlap_tokens=0):
+    """
+    Splits an oversized prose block on line, then word, boundaries without
+    cutting through an inline `code span`. Each piece after the first repeats up
+    to overlap_tokens of the previous one. Code blocks are returned whole.
+    """
+    if _FENCE.match(block) or estimate_tokens(block) <= max_tokens:
+        return [block]
+
+    # (separator, unit): whole lines where they fit, otherwise words. A word
+    # pattern that swallows `code spans` keeps commands in one piece.
+    units = []
+    for line in block.splitlines():
+        if estimate_tokens(line) <= max_tokens:
+            units.append(("\n", line))
+        else:
+            words = re.findall(r"(?:`[^`]*`|[^\s`])+", line)
+            units.extend([("\n", words[0])] + [(" ", word) for word in words[1:]])
+
+    pieces, current, fresh = [], [], False  # fresh: current holds more than the carried overlap
+    for unit in units:
+        if fresh and estimate_tokens(_join(current + [unit])) > max_tokens:
+            pieces.append(_join(current))
+            # Carry the tail of the previous piece over, as chunk_markdown does for blocks
+            overlap = []
+            for previous in reversed(current):
+                if estimate_tokens(_join([previous] + overlap)) > overlap_tokens:
+                    break
+                overlap.insert(0, previous)
+            while overlap and estimate_tokens(_join(overlap + [unit])) > max_tokens:
+                overlap.pop(0)
+            current = overlap
+        current.append(unit)
+        fresh = True
+    if current:
+        pieces.append(_join(current))
+    return pieces
+
+
+def chunk_markdown(text, max_tokens=CHUNK_MAX_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+    """
+    Yields (section, chunk) pairs. The chunk text starts with the section's header
+    path so it carries its context into the embedding.
+    """
+    for header_path, lines in _sections(text):
+        # Every chunk, including the pieces of a split block, gets this prefix
+        prefix = f"{header_path}\n\n" if header_path else ""
+        # Rounded up: estimate_tokens floors, so prefix + body could otherwise exceed max_tokens by one
+        budget = max(1, max_tokens - (len(prefix) + 3) // 4)
+
+        blocks = [piece for block in _blocks(lines) for piece in _split_block(block, budget, overlap_tokens)]
+        if not blocks:
+            continue  # A header with no body of its own (e.g. the document title)
+
+        current = []
+        for block in blocks:
+            if current and estimate_tokens("\n\n".join(current + [block])) > budget:
+                yield header_path or None, prefix + "\n\n".join(current)
+
+                # Carry the tail of the previous chunk over for continuity
+                overlap = []
+                for previous in reversed(current):
+                    if estimate_tokens("\n\n".join([previous] + overlap)) > overlap_tokens:
+                        break
+                    overlap.insert(0, previous)
+                # ...as long as the next block still fits after it
+                while overlap and estimate_tokens("\n\n".join(overlap + [block])) > budget:
+                    overlap.pop(0)
+                current = overlap
+            current.append(block)
+
+        if current:
+            yield header_path or None, prefix + "\n\n".join(current)
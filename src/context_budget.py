@@ -0,0 +1,186 @@
+import os
+import re
+import json
+
+from src.chunker import estimate_tokens
+
+# --- AGENT CONTEXT BUDGET ---
+# Every tool result is sent back to the LLM and stays in the conversation, so the
+# prompt grows each turn. Tool outputs are compacted before they are sent:
+#   - log lines that differ only in numbers/IDs are clustered into one line with a count
+#   - stack traces keep their first few frames
+#   - only the top runbook sections are kept, each capped in length
+# An incident's whole conversation must fit in LLM_TOKEN_BUDGET. As the budget runs
+# out, later tool results are compacted harder; once it is spent, the model is
+# asked to answer with what it has.
+
+LLM_TOKEN_BUDGET = int(os.environ.get("LLM_TOKEN_BUDGET", 12000))
+COMPACT_LOG_LINES = int(os.environ.get("COMPACT_LOG_LINES", 20))
+COMPACT_LINE_CHARS = 300
+COMPACT_STACK_FRAMES = 3
+COMPACT_RUNBOOK_SECTIONS = int(os.environ.get("COMPACT_RUNBOOK_SECTIONS", 2))
+COMPACT_RUNBOOK_CHARS = int(os.environ.get("COMPACT_RUNBOOK_CHARS", 1200))
+# Below this many tokens of headroom a tool result is replaced by a short note
+MIN_RESULT_TOKENS = 50
+
+_COUNT_SUFFIX = re.compile(r" ×([\d,]+)$")
+_VARIABLE = re.compile(
+    r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}"  # UUIDs
+    r"|0x[0-9a-fA-F]+"                                                 # Addresses
+    r"|'[^']*'|\"[^\"]*\""                                             # Quoted values
+    r"|\d+(?:\.\d+)?"                                                  # Numbers, ports, line numbers
+)
+_STACK_FRAME = re.compile(r"(?:\n\s*|\s+)(?=at [\w$.<>]+\(|File \")")
+
+
+def message_tokens(message):
+    """
+    Estimated tokens for a prompt string or a JSON-able tool result.
+    """
+    return estimate_tokens(message if isinstance(message, str) else json.dumps(message))
+
+
+def truncate_stack(line, max_frames=COMPACT_STACK_FRAMES):
+    """
+    "Error ... at a.B(B.java:1) at c.D(D.java:2) ..." -> the message and its first few frames.
+    """
+    parts = _STACK_FRAME.split(line)
+    if len(parts) <= max_frames + 1:
+        return line
+    return " ".join(parts[:max_frames + 1]) + f" … {len(parts) - max_frames - 1} more frame(s)"
+
+
+def compact_log_lines(lines, max_lines=COMPACT_LOG_LINES, max_chars=COMPACT_LINE_CHARS):
+    """
+    Clusters near-identical lines (same message once numbers, IDs and quoted values
+    are masked) into the first example plus a total count.
+    """
+    if not isinstance(lines, list):
+        return lines
+
+    clusters = {}  # masked message -> [first line, count]
+    notes = []
+    for line in lines:
+        if line.startswith("... "):
+            notes.append(line)  # "... N more matching message(s) omitted."
+            continue
+        match = _COUNT_SUFFIX.search(line)
+        count = int(match.group(1).replace(",", "")) if match else 1
+        line = _COUNT_SUFFIX.sub("", line)
+
+        key = _VARIABLE.sub("#", line.split(" ", 1)[-1])
+        if key in clusters:
+            clusters[key][1] += count
+        else:
+            clusters[key] = [line, count]
+
+    # Most frequent first: that's where the incident usually is
+    ranked = sorted(clusters.values(), key=lambda cluster: -cluster[1])
+    compacted = []
+    for line, count in ranked[:max_lines]:
+        line = truncate_stack(line)
+        if len(line) > max_chars:
+            line = line[:max_chars] + "…"
+        compacted.append(line if count == 1 else f"{line} ×{count:,}")
+
+    omitted = len(ranked) - len(compacted)
+    if omitted:
+        notes.insert(0, f"... {omitted:,} more distinct message(s) omitted.")
+    return compacted + notes
+
+
+def compact_runbooks(hits, max_sections=COMPACT_RUNBOOK_SECTIONS, max_chars=COMPACT_RUNBOOK_CHARS):
+    """
+    Keeps the best-scoring sections, capped in length, without the retrieval metadata
+    the model doesn't need.
+    """
+    if not isinstance(hits, list):
+        return hits
+    best = sorted(hits, key=lambda hit: -hit.get("score", 0))[:max_sections]
+    return [
+        {
+            "section": hit.get("section"),
+            "score": hit.get("score"),
+            "content": hit["content"] if len(hit["content"]) <= max_chars else hit["content"][:max_chars] + "…",
+        }
+        for hit in best
+    ]
+
+
+def compact_tool_output(tool_name, output, scale=1.0):
+    """
+    scale < 1 compacts harder (fewer lines, fewer/shorter sections).
+    """
+    if tool_name == "search_logs":
+        return compact_log_lines(output, max_lines=max(3, int(COMPACT_LOG_LINES * scale)),
+                                 max_chars=max(120, int(COMPACT_LINE_CHARS * scale)))
+    if tool_name == "search_runbooks":
+        return compact_runbooks(output, max_sections=max(1, round(COMPACT_RUNBOOK_SECTIONS * scale)),
+                                max_chars=max(300, int(COMPACT_RUNBOOK_CHARS * scale)))
+    return output
+
+
+class ContextBudget:
+    """
+    Tracks one incident's conversation size against its token budget.
+    """
+
+    def __init__(self, budget_tokens=LLM_TOKEN_BUDGET):
+        self.budget_tokens = budget_tokens
+        self.used_tokens = 0
+        self.raw_result_tokens = 0  # What the tool results would have cost uncompacted
+        self.sent_result_tokens = 0
+
+    @property
+    def remaining(self):
+        return self.budget_tokens - self.used_tokens
+
+    @property
+    def exhausted(self):
+        return self.remaining < MIN_RESULT_TOKENS
+
+    def add_prompt(self, prompt):
+        self.used_tokens += message_tokens(prompt)
+
+    def add_reply(self, response):
+        """
+        Counts the model's reply (reported output tokens, or an estimate).
+        """
+        self.used_tokens += response.output_tokens or message_tokens(response.text) + sum(
+            message_tokens(call.args) for call in response.tool_calls
+        )
+
+    def fit_tool_results(self, tool_results):
+        """
+        [(ToolCall, output_json), ...] -> the same, compacted to fit the remaining budget.
+        """
+        share = max(0, self.remaining) // max(1, len(tool_results))
+        fitted = []
+        for call, output_json in tool_results:
+            self.raw_result_tokens += message_tokens(output_json)
+            output = json.loads(output_json)
+
+            compacted, scale = output_json, 1.0
+            while scale >= 0.1:
+                compacted = json.dumps(compact_tool_output(call.name, output, scale))
+                if message_tokens(compacted) <= share:
+                    break
+                scale /= 2
+            if message_tokens(compacted) > share:
+                compacted = json.dumps({
+                    "note": "Omitted: the investigation's context budget is spent. "
+                            "Give your final summary with the evidence you already have."
+                })
+
+            self.sent_result_tokens += message_tokens(compacted)
+            self.used_tokens += message_tokens(compacted)
+            fitted.append((call, compacted))
+        return fitted
+
+    def stats(self):
+        return {
+            "budget_tokens": self.budget_tokens,
+            "used_tokens": self.used_tokens,
+            "tool_result_tokens_raw": self.raw_result_tokens,
+            "tool_result_tokens_sent": self.sent_result_tokens,
+        }
@@ -0,0 +1,129 @@
+import os
+import asyncio
+import psycopg
+from psycopg_pool import AsyncConnectionPool
+from pgvector.psycopg import register_vector_async
+
+# --- SHARED POSTGRES CONNECTION POOL ---
+# One pool per worker process. Connections are long-lived, have the pgvector types
+# registered once when they are created, and are health-checked before being handed out.
+
+DB_CONNECTION = os.environ.get("DB_CONNECTION")
+DB_POOL_MIN_SIZE = int(os.environ.get("DB_POOL_MIN_SIZE", 1))
+DB_POOL_MAX_SIZE = int(os.environ.get("DB_POOL_MAX_SIZE", 10))
+DB_POOL_TIMEOUT_SECONDS = float(os.environ.get("DB_POOL_TIMEOUT_SECONDS", 10))
+
+# --- VECTOR INDEX SETTINGS (runbook_chunks) ---
+# "hnsw" (better recall/latency, slower to build) or "ivfflat" (faster to build).
+RUNBOOK_INDEX_TYPE = os.environ.get("RUNBOOK_INDEX_TYPE", "hnsw")
+HNSW_M = int(os.environ.get("HNSW_M", 16))
+HNSW_EF_CONSTRUCTION = int(os.environ.get("HNSW_EF_CONSTRUCTION", 64))
+HNSW_EF_SEARCH = int(os.environ.get("HNSW_EF_SEARCH", 40))
+IVFFLAT_LISTS = int(os.environ.get("IVFFLAT_LISTS", 100))
+IVFFLAT_PROBES = int(os.environ.get("IVFFLAT_PROBES", 10))
+# pgvector >= 0.8: keep scanning the index until LIMIT rows pass the WHERE clause (the
+# service filter), instead of filtering a fixed ef_search/probes candidate set.
+# "relaxed_order", "strict_order", or "off".
+VECTOR_ITERATIVE_SCAN = os.environ.get("VECTOR_ITERATIVE_SCAN", "relaxed_order")
+
+_pool = None
+_pool_lock = None
+
+
+def vector_index_name(table="runbook_chunks"):
+    """
+    The ANN index's name encodes its type and build parameters, so changing them
+    creates a new index instead of silently keeping the old one.
+    """
+    if RUNBOOK_INDEX_TYPE == "ivfflat":
+        return f"{table}_embedding_ivfflat_l{IVFFLAT_LISTS}_idx"
+    return f"{table}_embedding_hnsw_m{HNSW_M}_ef{HNSW_EF_CONSTRUCTION}_idx"
+
+
+def vector_index_ddl(table="runbook_chunks"):
+    """
+    Returns the CREATE INDEX statement for the table's cosine-distance ANN index.
+    """
+    if RUNBOOK_INDEX_TYPE == "ivfflat":
+        return (f"CREATE INDEX IF NOT EXISTS {vector_index_name(table)} ON {table} "
+                f"USING ivfflat (embedding vector_cosine_ops) WITH (lists = {IVFFLAT_LISTS})")
+    return (f"CREATE INDEX IF NOT EXISTS {vector_index_name(table)} ON {table} "
+            f"USING hnsw (embedding vector_cosine_ops) WITH (m = {HNSW_M}, ef_construction = {HNSW_EF_CONSTRUCTION})")
+
+
+def vector_search_settings():
+    """
+    Returns the per-session SET statements that tune ANN search recall vs. speed.
+    """
+    if RUNBOOK_INDEX_TYPE == "ivfflat":
+        return [f"SET ivfflat.probes = {IVFFLAT_PROBES}"]
+    return [f"SET hnsw.ef_search = {HNSW_EF_SEARCH}"]
+
+
+def vector_iterative_scan_setting():
+    """
+    Returns the SET statement that turns on filtered iterative index scans, or None.
+    """
+    if VECTOR_ITERATIVE_SCAN == "off":
+        return None
+    return f"SET {RUNBOOK_INDEX_TYPE}.iterative_scan = {VECTOR_ITERATIVE_SCAN}"
+
+
+async def _configure(conn):
+    # Runs once per new connection, not once per query
+    await register_vector_async(conn)
+    for statement in vector_search_settings():
+        await conn.execute(statement)
+
+    statement = vector_iterative_scan_setting()
+    if statement:
+        try:
+            await conn.execute(statement)
+        except psycopg.Error:
+            # pgvector < 0.8: search_runbooks falls back to an exact scan when filtering runs short
+            pass
+
+
+async def open_pool():
+    """
+    Opens the process-wide pool. Called by the worker on startup; safe to call twice.
+    Doesn't wait for the first connections: with Postgres down the worker still starts
+    and only the queries that need it (runbook search) fail, after DB_POOL_TIMEOUT_SECONDS.
+    """
+    global _pool, _pool_lock
+    if _pool_lock is None:
+        _pool_lock = asyncio.Lock()
+
+    async with _pool_lock:
+        if _pool is None:
+            pool = AsyncConnectionPool(
+                DB_CONNECTION,
+                min_size=DB_POOL_MIN_SIZE,
+                max_size=DB_POOL_MAX_SIZE,
+                timeout=DB_POOL_TIMEOUT_SECONDS,
+                kwargs={"autocommit": True},
+                configure=_configure,
+                check=AsyncConnectionPool.check_connection,
+                open=False,
+            )
+            await pool.open(wait=False)
+            print(f"--- 🗄️ DB: Connection pool opening (min={DB_POOL_MIN_SIZE}, max={DB_POOL_MAX_SIZE}) ---")
+            _pool = pool
+    return _pool
+
+
+async def close_pool():
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+        print("--- 🗄️ DB: Connection pool closed ---")
+
+
+async def get_pool():
+    """
+    Returns the open pool, opening it lazily if the worker didn't.
+    """
+    if _pool is None:
+        return await open_pool()
+    return _pool
@@ -0,0 +1,192 @@
+import os
+import re
+import time
+import array
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+import google.generativeai as genai
+
+# --- EMBEDDING CACHE CONFIGURATION ---
+EMBEDDING_MODEL = "models/text-embedding-004"
+EMBEDDING_DIMENSIONS = 768  # runbook_chunks.embedding is vector(768)
+# "gemini" (default) or "hash": an offline feature-hashing embedding, for benchmarks
+# and local runs without an API key. Ingest and retrieval must use the same one.
+EMBEDDING_PROVIDER = os.environ.get("EMBEDDING_PROVIDER", "gemini")
+EMBEDDING_CACHE_SIZE = int(os.environ.get("EMBEDDING_CACHE_SIZE", 1024))
+EMBEDDING_CACHE_TTL_SECONDS = int(os.environ.get("EMBEDDING_CACHE_TTL_SECONDS", 7 * 24 * 3600))
+# On-disk tier so the cache survives worker restarts. Set to "" to disable.
+EMBEDDING_CACHE_PATH = os.environ.get("EMBEDDING_CACHE_PATH", ".cache/embeddings.sqlite")
+
+
+def normalize_query(text):
+    """
+    "  High CPU " and "high cpu" should hit the same cache entry. Only used for the
+    cache key: the API embeds the original text, the way documents were embedded.
+    """
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+def cache_key(model, task_type, text):
+    return hashlib.sha256(f"{model}\0{task_type}\0{normalize_query(text)}".encode()).hexdigest()
+
+
+def hash_embedding(text, dimensions=EMBEDDING_DIMENSIONS):
+    """
+    Bag-of-words feature hashing, L2-normalised: texts sharing words get a higher
+    cosine similarity. No API call; only meant for EMBEDDING_PROVIDER=hash.
+    """
+    vector = [0.0] * dimensions
+    for word in re.findall(r"\w+", text.lower()):
+        digest = hashlib.blake2b(word.encode(), digest_size=8).digest()
+        index = int.from_bytes(digest[:4], "little") % dimensions
+        vector[index] += 1.0 if digest[4] & 1 else -1.0
+    norm = sum(value * value for value in vector) ** 0.5 or 1.0
+    return [value / norm for value in vector]
+
+
+def embed_documents(texts, model=EMBEDDING_MODEL):
+    """
+    Embeddings for a batch of runbook chunks (ingest side).
+    """
+    if EMBEDDING_PROVIDER == "hash":
+        return [hash_embedding(text) for text in texts]
+    result = genai.embed_content(model=model, content=texts, task_type="retrieval_document")
+    return result['embedding']
+
+
+class EmbeddingCache:
+    """
+    Two-tier embedding cache: an in-process LRU with TTL, backed by a SQLite file.
+    """
+
+    def __init__(self, max_entries=EMBEDDING_CACHE_SIZE, ttl_seconds=EMBEDDING_CACHE_TTL_SECONDS,
+                 db_path=EMBEDDING_CACHE_PATH):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # key -> (expires_at, vector)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._db = None
+        if db_path:
+            os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS embedding_cache (
+                    key TEXT PRIMARY KEY,
+                    vector BLOB NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            """)
+            self._db.commit()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry:
+                del self._entries[key]  # Expired
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT vector, expires_at FROM embedding_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row and row[1] > now:
+                    vector = array.array("f", row[0]).tolist()
+                    self._remember(key, vector, row[1])
+                    self.disk_hits += 1
+                    return vector
+
+            self.misses += 1
+            return None
+
+    def put(self, key, vector):
+        expires_at = time.time() + self.ttl_seconds
+        with self._lock:
+            self._remember(key, vector, expires_at)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO embedding_cache (key, vector, expires_at) VALUES (?, ?, ?)",
+                    (key, array.array("f", vector).tobytes(), expires_at),
+                )
+                self._db.execute("DELETE FROM embedding_cache WHERE expires_at <= ?", (time.time(),))
+                self._db.commit()
+
+    def _remember(self, key, vector, expires_at):
+        self._entries[key] = (expires_at, vector)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self):
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_ratio": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            "size": len(self._entries),
+        }
+
+
+_cache = None
+
+
+def get_embedding_cache():
+    global _cache
+    if _cache is None:
+        _cache = EmbeddingCache()
+    return _cache
+
+
+def embed_query(text, model=EMBEDDING_MODEL, task_type="retrieval_query"):
+    """
+    Returns the embedding for a query, only calling the embedding API on a cache miss.
+    """
+    if EMBEDDING_PROVIDER == "hash":
+        return hash_embedding(text)  # Cheaper than a cache lookup
+    cache = get_embedding_cache()
+    key = cache_key(model, task_type, text)
+
+    vector = cache.get(key)
+    if vector is None:
+        result = genai.embed_content(
+            model=model,
+            content=text,
+            task_type=task_type
+        )
+        vector = result['embedding']
+        cache.put(key, vector)
+
+    return vector
+
+
+async def embed_query_async(text, model=EMBEDDING_MODEL, task_type="retrieval_query"):
+    """
+    Async version of embed_query, so callers on the event loop don't block on the API.
+    """
+    if EMBEDDING_PROVIDER == "hash":
+        return hash_embedding(text)
+    cache = get_embedding_cache()
+    key = cache_key(model, task_type, text)
+
+    vector = cache.get(key)
+    if vector is None:
+        result = await genai.embed_content_async(
+            model=model,
+            content=text,
+            task_type=task_type
+        )
+        vector = result['embedding']
+        cache.put(key, vector)
+
+    return vector
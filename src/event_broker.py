@@ -0,0 +1,150 @@
+import os
+import json
+import time
+import asyncio
+
+# --- INCIDENT EVENT FAN-OUT ---
+# One change-feed task per API process reads the incident store (which the API and
+# the workflow's record_incident activity write to) and fans each change out to every
+# connected dashboard. Store load stays flat no matter how many dashboards are open,
+# and Temporal is never queried for them.
+
+EVENT_POLL_SECONDS = float(os.environ.get("EVENT_POLL_SECONDS", 0.5))
+SUBSCRIBER_QUEUE_SIZE = int(os.environ.get("SUBSCRIBER_QUEUE_SIZE", 1000))
+CHANGE_FEED_BATCH = 500
+SEEN_TTL_SECONDS = 24 * 3600
+
+
+def incident_events(previous, incident):
+    """
+    Event types for one incident change. previous is the last seen state, or None.
+    """
+    if previous is None:
+        return ["incident_created"] if incident["created_at"] == incident["updated_at"] else ["incident_updated"]
+
+    events = []
+    if incident["alert_count"] != previous["alert_count"]:
+        events.append("alert_coalesced")
+    if incident["summary"] != previous["summary"] and incident["summary"]:
+        events.append("summary_updated")
+    if incident["progress"] != previous["progress"] and incident["progress"]:
+        events.append("progress")
+    if incident["status"] != previous["status"]:
+        # approved, awaiting_approval, remediated, timed_out, ...
+        events.append(incident["status"])
+    return events or ["incident_updated"]
+
+
+class Subscriber:
+    def __init__(self, maxsize):
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.overflowed = False
+
+
+class EventBroker:
+    def __init__(self, maxsize=SUBSCRIBER_QUEUE_SIZE):
+        self.maxsize = maxsize
+        self._subscribers = set()
+        self.published = 0
+        self.dropped_subscribers = 0
+
+    def subscribe(self):
+        subscriber = Subscriber(self.maxsize)
+        self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        self._subscribers.discard(subscriber)
+
+    def publish(self, event):
+        """
+        Non-blocking fan-out. A subscriber that falls a whole queue behind is cut off
+        (its stream ends and the client reconnects with Last-Event-ID) instead of
+        slowing down everyone else.
+        """
+        self.published += 1
+        for subscriber in list(self._subscribers):
+            try:
+                subscriber.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                subscriber.overflowed = True
+                self.dropped_subscribers += 1
+                self._subscribers.discard(subscriber)
+
+    def metrics(self):
+        return {
+            "subscribers": len(self._subscribers),
+            "published": self.published,
+            "dropped_subscribers": self.dropped_subscribers,
+        }
+
+
+class ChangeFeed:
+    """
+    Polls the store's (updated_at, id) index for changed incidents and publishes
+    one event per change.
+    """
+
+    def __init__(self, store, broker, cursor_encoder, interval=EVENT_POLL_SECONDS, safety_seconds=2.0):
+        self.store = store
+        self.broker = broker
+        self.encode_cursor = cursor_encoder
+        self.interval = interval
+        self.safety_seconds = safety_seconds
+        self._seen = {}  # id -> last published incident state
+        self._pruned_at = time.time()
+
+    async def run(self, since):
+        """
+        since: (updated_at, id) to start from. Rows in the last safety_seconds are
+        re-read every tick (writes may commit out of order); _seen filters the repeats.
+        """
+        while True:
+            try:
+                since = await self._tick(since)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"--- ❌ API: Incident change feed failed: {e} ---")
+            await asyncio.sleep(self.interval)
+
+    async def _tick(self, since):
+        rows = await asyncio.to_thread(self.store.list_incidents, None, None, CHANGE_FEED_BATCH, None, since)
+        for incident in rows[:CHANGE_FEED_BATCH]:
+            previous = self._seen.get(incident["id"])
+            if previous and previous["updated_at"] >= incident["updated_at"]:
+                continue
+            self._seen[incident["id"]] = incident
+            self.publish(previous, incident)
+
+        now = time.time()
+        if now - self._pruned_at > 60:
+            # Previous states are only needed to name the next change; keep a day's worth
+            self._seen = {key: value for key, value in self._seen.items()
+                          if value["updated_at"] >= now - SEEN_TTL_SECONDS}
+            self._pruned_at = now
+
+        if len(rows) > CHANGE_FEED_BATCH:
+            last = rows[CHANGE_FEED_BATCH - 1]
+            next_since = (last["updated_at"], last["id"])
+        else:
+            next_since = max(since, (now - self.safety_seconds, ""))
+
+        # Tombstones: incidents moved to the archive in the window just covered
+        for incident_id in await asyncio.to_thread(self.store.archived_between, since[0], next_since[0]):
+            self._seen.pop(incident_id, None)
+            cursor = self.encode_cursor((next_since[0], incident_id))
+            self.broker.publish({"id": cursor, "event": "incident_archived", "data": {"id": incident_id}})
+        return next_since
+
+    def publish(self, previous, incident):
+        cursor = self.encode_cursor((incident["updated_at"], incident["id"]))
+        for event_type in incident_events(previous, incident):
+            self.broker.publish({"id": cursor, "event": event_type, "data": incident})
+
+
+def format_sse(event):
+    """
+    One Server-Sent Events message.
+    """
+    return f"id: {event['id']}\nevent: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
@@ -1,18 +1,31 @@
 import os
+import re
+import hashlib
 import google.generativeai as genai
 import psycopg
 from pgvector.psycopg import register_vector
 from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor
+
+from src.chunker import chunk_markdown
+from src.db import RUNBOOK_INDEX_TYPE, vector_index_ddl, vector_index_name
+from src.embeddings import EMBEDDING_PROVIDER, embed_documents
 
 # 1. Setup
 load_dotenv()
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 
-if not GOOGLE_API_KEY:
+if not GOOGLE_API_KEY and EMBEDDING_PROVIDER != "hash":
     print("❌ Error: GOOGLE_API_KEY not found.")
     exit(1)
 
-genai.configure(api_key=GOOGLE_API_KEY)
+if GOOGLE_API_KEY:
+    genai.configure(api_key=GOOGLE_API_KEY)
+
+KNOWLEDGE_DIR = os.environ.get("KNOWLEDGE_DIR", "knowledge")
+EMBED_MODEL = "models/text-embedding-004"
+EMBED_BATCH_SIZE = int(os.environ.get("EMBED_BATCH_SIZE", 50))    # The API accepts up to 100 texts per call
+EMBED_CONCURRENCY = int(os.environ.get("EMBED_CONCURRENCY", 4))   # Batches in flight at once
 
 # 2. Connect to the Database
 try:
@@ -24,56 +37,148 @@ except Exception as e:
     exit(1)
 
 # 3. Prepare the Table
-# We use 768 dimensions because that is the size of Gemini's text-embedding-004 model
+# We use 768 dimensions because that is the size of Gemini's text-embedding-004 model.
+# The table is never dropped: retrieval keeps working while we ingest, and
+# unchanged chunks keep their embeddings.
 conn.execute("CREATE EXTENSION IF NOT EXISTS vector")
 register_vector(conn)
 
-print("--- 📚 Librarian: Creating 'runbook_chunks' table... ---")
-conn.execute("DROP TABLE IF EXISTS runbook_chunks")
+print("--- 📚 Librarian: Preparing 'runbook_chunks' table... ---")
 conn.execute("""
-    CREATE TABLE runbook_chunks (
+    CREATE TABLE IF NOT EXISTS runbook_chunks (
         id bigserial PRIMARY KEY,
         content text,
-        embedding vector(768) 
+        embedding vector(768),
+        service text,        -- NULL means "applies to every service"
+        section text,        -- Markdown header the chunk belongs to
+        source_file text,
+        content_hash text    -- sha256 of the chunk, its metadata and the embedder
     )
 """)
+# Tables created by older versions of this script lack the newer columns
+for column in ("service text", "section text", "source_file text", "content_hash text"):
+    conn.execute(f"ALTER TABLE runbook_chunks ADD COLUMN IF NOT EXISTS {column}")
+conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS runbook_chunks_content_hash_idx ON runbook_chunks (content_hash)")
+# One row, bumped whenever the corpus changes; cached investigations that used an
+# older corpus are no longer reused.
+conn.execute("""
+    CREATE TABLE IF NOT EXISTS runbook_corpus (
+        id int PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+        version bigint NOT NULL DEFAULT 0,
+        updated_at timestamptz NOT NULL DEFAULT now()
+    )
+""")
+conn.execute("INSERT INTO runbook_corpus (id) VALUES (1) ON CONFLICT (id) DO NOTHING")
+
+def service_for(path, text):
+    """
+    knowledge/<service>/*.md belongs to <service>. Otherwise the title decides:
+    "# AuthService Runbook" -> "auth-service". No match means the runbook applies to every service.
+    """
+    relative = os.path.relpath(path, KNOWLEDGE_DIR)
+    if os.sep in relative:
+        return relative.split(os.sep, 1)[0]
+
+    title = re.search(r"^# (.+?) Runbook\s*$", text, re.MULTILINE)
+    if not title:
+        return None
+    return re.sub(r"(?<!^)(?=[A-Z])", "-", title.group(1).replace(" ", "")).lower()
+
+def chunk_hash(source_file, service, section, chunk):
+    # The embedder is part of the hash: switching EMBEDDING_PROVIDER re-embeds every
+    # chunk and drops the old vectors instead of mixing the two in one table.
+    embedder = f"{EMBEDDING_PROVIDER}:{EMBED_MODEL}"
+    return hashlib.sha256("\0".join([embedder, source_file, service or "", section or "", chunk]).encode()).hexdigest()
 
 # 4. Read the Knowledge
-print("--- 📚 Librarian: Reading runbook.md... ---")
-try:
-    with open("knowledge/runbook.md", "r") as f:
-        text = f.read()
-except FileNotFoundError:
-    print("❌ Error: knowledge/runbook.md not found.")
+print(f"--- 📚 Librarian: Reading {KNOWLEDGE_DIR}/... ---")
+desired = {}  # content_hash -> (content, service, section, source_file)
+for root, _, files in os.walk(KNOWLEDGE_DIR):
+    for name in sorted(files):
+        if not name.endswith(".md"):
+            continue
+        source_file = os.path.join(root, name)
+        with open(source_file, "r") as f:
+            text = f.read()
+
+        service = service_for(source_file, text)
+
+        # 5. Split into Chunks
+        # One chunk per Markdown section (split further only if it is too long),
+        # each prefixed with its header path so the fix stays with its symptom.
+        for section, chunk in chunk_markdown(text):
+            desired[chunk_hash(source_file, service, section, chunk)] = (chunk, service, section, source_file)
+
+if not desired:
+    print(f"❌ Error: no markdown runbooks found in {KNOWLEDGE_DIR}/.")
     exit(1)
+print(f"--- 📚 Librarian: Found {len(desired)} chunks of knowledge. ---")
 
-# 5. Split into Chunks
-# Simple splitting by double newlines (paragraphs/headers)
-chunks = text.split("\n\n")
-print(f"--- 📚 Librarian: Found {len(chunks)} chunks of knowledge. ---")
+# 6. Diff against what is already stored
+existing = {row[0] for row in conn.execute("SELECT content_hash FROM runbook_chunks")}
+new_hashes = [h for h in desired if h not in existing]
+stale_hashes = [h for h in existing if h is not None and h not in desired]
+# Rows from before content hashing existed can't be matched; they get replaced
+has_unhashed_rows = None in existing
+print(f"--- 📚 Librarian: {len(new_hashes)} new/changed, {len(stale_hashes)} removed, "
+      f"{len(desired) - len(new_hashes)} unchanged. ---")
 
-# 6. Embed and Store
-print("--- 📚 Librarian: Embedding and storing chunks... ---")
-model_name = "models/text-embedding-004"
+# 7. Embed only the new/changed chunks, in batches, a few batches at a time
+def embed_batch(hashes):
+    return list(zip(hashes, embed_documents([desired[h][0] for h in hashes], model=EMBED_MODEL)))
 
-for i, chunk in enumerate(chunks):
-    if not chunk.strip():
-        continue
+embeddings = []
+if new_hashes:
+    print("--- 📚 Librarian: Embedding new chunks... ---")
+    batches = [new_hashes[i:i + EMBED_BATCH_SIZE] for i in range(0, len(new_hashes), EMBED_BATCH_SIZE)]
+    with ThreadPoolExecutor(max_workers=EMBED_CONCURRENCY) as executor:
+        for i, batch in enumerate(executor.map(embed_batch, batches)):
+            embeddings.extend(batch)
+            print(f"   ✅ Embedded batch {i+1}/{len(batches)}")
 
-    # Generate Vector (Math) for the text
-    result = genai.embed_content(
-        model=model_name,
-        content=chunk,
-        task_type="retrieval_document"
-    )
-    embedding = result['embedding']
+# 8. Apply the whole run as one transaction
+# Readers see either the previous corpus or the new one, never a half-ingested mix.
+corpus_changed = bool(new_hashes or stale_hashes or has_unhashed_rows)
+if corpus_changed:
+    print("--- 📚 Librarian: Swapping in the new corpus... ---")
+    with conn.transaction():
+        with conn.cursor() as cur:
+            cur.executemany(
+                """
+                INSERT INTO runbook_chunks (content, embedding, service, section, source_file, content_hash)
+                VALUES (%s, %s, %s, %s, %s, %s)
+                """,
+                [(desired[h][0], embedding, desired[h][1], desired[h][2], desired[h][3], h) for h, embedding in embeddings]
+            )
+        if stale_hashes:
+            conn.execute("DELETE FROM runbook_chunks WHERE content_hash = ANY(%s)", (stale_hashes,))
+        if has_unhashed_rows:
+            conn.execute("DELETE FROM runbook_chunks WHERE content_hash IS NULL")
+        conn.execute("UPDATE runbook_corpus SET version = version + 1, updated_at = now()")
 
-    # Insert into Postgres
-    conn.execute(
-        "INSERT INTO runbook_chunks (content, embedding) VALUES (%s, %s)",
-        (chunk, embedding)
-    )
-    print(f"   ✅ Stored chunk {i+1}/{len(chunks)}")
+# 9. Build the indexes
+# The ANN index replaces a sequential scan over every chunk; the service index
+# lets retrieval filter to the alert's service before ranking.
+print("--- 📚 Librarian: Ensuring vector index... ---")
+index_name = vector_index_name("runbook_chunks")
+vector_indexes = [row[0] for row in conn.execute(
+    "SELECT indexname FROM pg_indexes WHERE tablename = 'runbook_chunks' AND indexname LIKE 'runbook\\_chunks\\_embedding%'"
+)]
+conn.execute(vector_index_ddl("runbook_chunks"))
+# Indexes built with another RUNBOOK_INDEX_TYPE or other build parameters (including
+# the unversioned runbook_chunks_embedding_idx) would otherwise be kept forever.
+# Dropped only once the new one exists, so retrieval never loses its index.
+for stale_index in vector_indexes:
+    if stale_index != index_name:
+        print(f"--- 📚 Librarian: Dropping outdated vector index {stale_index}... ---")
+        conn.execute(f"DROP INDEX IF EXISTS {stale_index}")
+if corpus_changed and RUNBOOK_INDEX_TYPE == "ivfflat" and index_name in vector_indexes:
+    # IVFFlat's lists are clustered from the rows present at build time; re-cluster
+    # so an index built on an early, small corpus doesn't keep its poor centroids
+    conn.execute(f"REINDEX INDEX {index_name}")
+conn.execute("CREATE INDEX IF NOT EXISTS runbook_chunks_service_idx ON runbook_chunks (service)")
+if corpus_changed:
+    conn.execute("ANALYZE runbook_chunks")
 
-print("--- 🎉 Success! The Brain is populated. ---")
+print(f"--- 🎉 Success! The Brain is populated ({len(new_hashes)} embedding(s) computed). ---")
 conn.close()
@@ -0,0 +1,169 @@
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import threading
+
+# --- INVESTIGATION RESULT CACHE ---
+# The same alert with the same evidence gets the same analysis, so there is no
+# need for another multi-turn LLM conversation. Entries are keyed on the alert plus
+# a digest of the evidence: error signatures from the logs, and the IDs of the
+# runbook chunks that retrieval returned. The runbook corpus version is part of
+# the key, so re-ingesting the runbooks invalidates every entry.
+
+INVESTIGATION_CACHE_PATH = os.environ.get("INVESTIGATION_CACHE_PATH", ".cache/investigations.sqlite")
+INVESTIGATION_CACHE_TTL_SECONDS = int(os.environ.get("INVESTIGATION_CACHE_TTL_SECONDS", 6 * 3600))
+# Used to report what the hits saved; defaults are Gemini Pro list prices (USD per 1K tokens)
+LLM_COST_PER_1K_INPUT_TOKENS = float(os.environ.get("LLM_COST_PER_1K_INPUT_TOKENS", 0.00125))
+LLM_COST_PER_1K_OUTPUT_TOKENS = float(os.environ.get("LLM_COST_PER_1K_OUTPUT_TOKENS", 0.01))
+
+_COUNT_SUFFIX = re.compile(r" ×[\d,]+$")
+
+
+def log_signatures(log_lines):
+    """
+    search_logs output -> the set of distinct messages, without timestamps or repeat counts.
+    """
+    if not isinstance(log_lines, list):
+        return []
+    return sorted({
+        _COUNT_SUFFIX.sub("", line.split(" ", 1)[-1])
+        for line in log_lines
+        if not line.startswith(("... ", "ERROR: "))
+    })
+
+
+def evidence_digest(log_lines, runbook_hits):
+    """
+    Digest of what the investigation is based on, or None if the evidence couldn't be
+    gathered (a failed tool must not be cached as "no evidence").
+    """
+    if not isinstance(log_lines, list) or not isinstance(runbook_hits, list):
+        return None
+    chunk_ids = sorted(hit["id"] for hit in runbook_hits)
+    payload = "\n".join(log_signatures(log_lines)) + "\0" + ",".join(map(str, chunk_ids))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def fingerprint(alert, digest, corpus_version):
+    if digest is None or corpus_version is None:
+        return None
+    key = f"{alert['service']}\0{alert['error_message']}\0{digest}\0{corpus_version}"
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def llm_cost(input_tokens, output_tokens):
+    return input_tokens / 1000 * LLM_COST_PER_1K_INPUT_TOKENS + output_tokens / 1000 * LLM_COST_PER_1K_OUTPUT_TOKENS
+
+
+class InvestigationCache:
+    """
+    SQLite-backed, so every worker process on the host (and the API, for metrics)
+    shares the entries and the counters.
+    """
+
+    def __init__(self, db_path=INVESTIGATION_CACHE_PATH, ttl_seconds=INVESTIGATION_CACHE_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._lock = threading.Lock()
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS investigations (
+                fingerprint TEXT PRIMARY KEY,
+                summary TEXT NOT NULL,
+                corpus_version INTEGER NOT NULL,
+                input_tokens INTEGER NOT NULL,
+                output_tokens INTEGER NOT NULL,
+                llm_seconds REAL NOT NULL,
+                created_at REAL NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        """)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS investigation_cache_stats (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                hits INTEGER NOT NULL DEFAULT 0,
+                misses INTEGER NOT NULL DEFAULT 0,
+                saved_input_tokens INTEGER NOT NULL DEFAULT 0,
+                saved_output_tokens INTEGER NOT NULL DEFAULT 0,
+                saved_llm_seconds REAL NOT NULL DEFAULT 0
+            )
+        """)
+        self._db.execute("INSERT OR IGNORE INTO investigation_cache_stats (id) VALUES (1)")
+        self._db.commit()
+
+    def get(self, key):
+        """
+        The cached entry for a fingerprint, or None. Counts the hit or miss, and on a
+        hit the tokens and LLM time it saved.
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT summary, input_tokens, output_tokens, llm_seconds, created_at FROM investigations "
+                "WHERE fingerprint = ? AND expires_at > ?",
+                (key, time.time()),
+            ).fetchone()
+            if row is None:
+                self._db.execute("UPDATE investigation_cache_stats SET misses = misses + 1 WHERE id = 1")
+                self._db.commit()
+                return None
+
+            summary, input_tokens, output_tokens, llm_seconds, created_at = row
+            self._db.execute(
+                """
+                UPDATE investigation_cache_stats SET
+                    hits = hits + 1,
+                    saved_input_tokens = saved_input_tokens + ?,
+                    saved_output_tokens = saved_output_tokens + ?,
+                    saved_llm_seconds = saved_llm_seconds + ?
+                WHERE id = 1
+                """,
+                (input_tokens, output_tokens, llm_seconds),
+            )
+            self._db.commit()
+            return {"summary": summary, "input_tokens": input_tokens, "output_tokens": output_tokens,
+                    "llm_seconds": llm_seconds, "created_at": created_at}
+
+    def put(self, key, summary, corpus_version, input_tokens, output_tokens, llm_seconds):
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO investigations VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, summary, corpus_version, input_tokens, output_tokens, llm_seconds, now, now + self.ttl_seconds),
+            )
+            # Expired entries, and entries from an older runbook corpus, can never hit again
+            self._db.execute(
+                "DELETE FROM investigations WHERE expires_at <= ? OR corpus_version != ?", (now, corpus_version)
+            )
+            self._db.commit()
+
+    def stats(self):
+        with self._lock:
+            hits, misses, input_tokens, output_tokens, llm_seconds = self._db.execute(
+                "SELECT hits, misses, saved_input_tokens, saved_output_tokens, saved_llm_seconds "
+                "FROM investigation_cache_stats WHERE id = 1"
+            ).fetchone()
+            size = self._db.execute("SELECT COUNT(*) FROM investigations").fetchone()[0]
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": hits / lookups if lookups else 0.0,
+            "saved_input_tokens": input_tokens,
+            "saved_output_tokens": output_tokens,
+            "saved_llm_seconds": round(llm_seconds, 1),
+            "saved_cost_usd": round(llm_cost(input_tokens, output_tokens), 4),
+            "size": size,
+        }
+
+
+_cache = None
+
+
+def get_investigation_cache():
+    global _cache
+    if _cache is None:
+        _cache = InvestigationCache()
+    return _cache
@@ -0,0 +1,391 @@
+import os
+import json
+import random
+import asyncio
+from abc import ABC, abstractmethod
+
+from src.chunker import estimate_tokens
+
+# --- PLUGGABLE LLM BACKENDS ---
+# run_investigation talks to an LLMSession and never to a vendor SDK directly.
+# Pick the backend with LLM_PROVIDER:
+#   gemini   (default) - Google Gemini via google-generativeai
+#   openai             - OpenAI chat completions
+#   scripted           - offline replay of recorded tool-call sequences, for load tests
+# Set LLM_RECORD_FILE to append every real conversation to a file that the
+# scripted provider can replay later.
+
+LLM_PROVIDER = os.environ.get("LLM_PROVIDER", "gemini")
+GEMINI_MODEL = os.environ.get("GEMINI_MODEL", "models/gemini-pro-latest")
+OPENAI_MODEL = os.environ.get("OPENAI_MODEL", "gpt-4o")
+LLM_SCRIPT_FILE = os.environ.get("LLM_SCRIPT_FILE")
+LLM_SCRIPTED_LATENCY_MS = float(os.environ.get("LLM_SCRIPTED_LATENCY_MS", 0))
+LLM_SCRIPTED_JITTER_MS = float(os.environ.get("LLM_SCRIPTED_JITTER_MS", 0))
+# Extra scripted latency per 1K prompt tokens, so replays reflect context size the way real models do
+LLM_SCRIPTED_MS_PER_1K_TOKENS = float(os.environ.get("LLM_SCRIPTED_MS_PER_1K_TOKENS", 0))
+LLM_RECORD_FILE = os.environ.get("LLM_RECORD_FILE")
+
+
+class ToolCall:
+    """
+    One function call requested by the model.
+    """
+
+    def __init__(self, name, args, call_id=None):
+        self.name = name
+        self.args = args
+        self.id = call_id or name
+
+
+class LLMResponse:
+    """
+    A model reply: either final text, or one or more tool calls (or both).
+    """
+
+    def __init__(self, text="", tool_calls=None, input_tokens=0, output_tokens=0):
+        self.text = text
+        self.tool_calls = tool_calls or []
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+
+
+class LLMSession(ABC):
+    """
+    One conversation. Subclasses implement send() and send_tool_results().
+    """
+
+    @abstractmethod
+    async def send(self, message):
+        """
+        Sends a user message and returns the model's LLMResponse.
+        """
+
+    @abstractmethod
+    async def send_tool_results(self, results):
+        """
+        Sends [(ToolCall, result_json_str), ...] back in one message and returns the next LLMResponse.
+        """
+
+
+class LLMProvider(ABC):
+    name = "base"
+
+    @abstractmethod
+    def start_session(self, system_prompt, tools, alert=None):
+        """
+        tools use the Gemini function-declaration format (see src/activities.py).
+        """
+
+
+# --- GEMINI ---
+
+class GeminiSession(LLMSession):
+    def __init__(self, chat):
+        self.chat = chat
+
+    async def send(self, message):
+        return self._parse(await self.chat.send_message_async(message))
+
+    async def send_tool_results(self, results):
+        # A raw DICTIONARY per function response avoids importing proto types
+        parts = [
+            {"function_response": {"name": call.name, "response": {"result": result}}}
+            for call, result in results
+        ]
+        return self._parse(await self.chat.send_message_async(parts))
+
+    @staticmethod
+    def _parse(response):
+        text_parts, tool_calls = [], []
+        for part in response.candidates[0].content.parts:
+            if part.function_call and part.function_call.name:
+                # to_dict turns the proto args (incl. nested lists) into plain Python values
+                call = type(part.function_call).to_dict(part.function_call)
+                tool_calls.append(ToolCall(call["name"], call.get("args") or {}))
+            elif getattr(part, "text", None):
+                text_parts.append(part.text)
+
+        usage = getattr(response, "usage_metadata", None)
+        return LLMResponse(
+            text="".join(text_parts),
+            tool_calls=tool_calls,
+            input_tokens=getattr(usage, "prompt_token_count", 0) or 0,
+            output_tokens=getattr(usage, "candidates_token_count", 0) or 0,
+        )
+
+
+class GeminiProvider(LLMProvider):
+    name = "gemini"
+
+    def __init__(self, model_name=GEMINI_MODEL):
+        import google.generativeai as genai
+
+        api_key = os.environ.get("GOOGLE_API_KEY")
+        if not api_key:
+            raise ValueError("GOOGLE_API_KEY not found. Did you set it in the .env file?")
+        genai.configure(api_key=api_key)
+        self.genai = genai
+        self.model_name = model_name
+        self._models = {}
+
+    def start_session(self, system_prompt, tools, alert=None):
+        # Models are cheap to keep and expensive to rebuild per incident
+        key = (system_prompt, json.dumps(tools, sort_keys=True))
+        if key not in self._models:
+            self._models[key] = self.genai.GenerativeModel(
+                model_name=self.model_name,
+                system_instruction=system_prompt,
+                tools=tools
+            )
+        return GeminiSession(self._models[key].start_chat())
+
+
+# --- OPENAI ---
+
+def _openai_schema(schema):
+    """
+    Gemini uses upper-case OpenAPI types ("OBJECT"); OpenAI expects JSON Schema ("object").
+    """
+    if isinstance(schema, dict):
+        return {
+            key: value.lower() if key == "type" and isinstance(value, str) else _openai_schema(value)
+            for key, value in schema.items()
+        }
+    if isinstance(schema, list):
+        return [_openai_schema(item) for item in schema]
+    return schema
+
+
+class OpenAISession(LLMSession):
+    def __init__(self, client, model_name, system_prompt, tools):
+        self.client = client
+        self.model_name = model_name
+        self.tools = [
+            {"type": "function", "function": {**tool, "parameters": _openai_schema(tool["parameters"])}}
+            for tool in tools
+        ]
+        self.messages = [{"role": "system", "content": system_prompt}]
+
+    async def send(self, message):
+        self.messages.append({"role": "user", "content": message})
+        return await self._complete()
+
+    async def send_tool_results(self, results):
+        for call, result in results:
+            self.messages.append({"role": "tool", "tool_call_id": call.id, "content": result})
+        return await self._complete()
+
+    async def _complete(self):
+        response = await self.client.chat.completions.create(
+            model=self.model_name,
+            messages=self.messages,
+            tools=self.tools,
+            tool_choice="auto"
+        )
+        message = response.choices[0].message
+        self.messages.append(message)
+
+        tool_calls = [
+            ToolCall(call.function.name, json.loads(call.function.arguments or "{}"), call.id)
+            for call in (message.tool_calls or [])
+        ]
+        usage = response.usage
+        return LLMResponse(
+            text=message.content or "",
+            tool_calls=tool_calls,
+            input_tokens=getattr(usage, "prompt_tokens", 0) or 0,
+            output_tokens=getattr(usage, "completion_tokens", 0) or 0,
+        )
+
+
+class OpenAIProvider(LLMProvider):
+    name = "openai"
+
+    def __init__(self, model_name=OPENAI_MODEL):
+        from openai import AsyncOpenAI
+
+        # It will automatically find the OPENAI_API_KEY in your environment.
+        self.client = AsyncOpenAI()
+        self.model_name = model_name
+
+    def start_session(self, system_prompt, tools, alert=None):
+        return OpenAISession(self.client, self.model_name, system_prompt, tools)
+
+
+# The first message of an investigation carries pre-fetched evidence under this header
+PREFETCHED_EVIDENCE_HEADER = "Evidence already gathered for this alert (no need to fetch it again):"
+PREFETCHED_TOOLS = ("search_logs", "search_runbooks")
+
+# --- SCRIPTED / REPLAY (offline) ---
+
+# Used when LLM_SCRIPT_FILE is not set: logs first, then runbooks, then a summary.
+# "{service}", "{timestamp}" and "{error_message}" are filled in from the alert.
+DEFAULT_SCRIPT = [
+    {"tool_calls": [{"name": "search_logs", "args": {"timestamp_str": "{timestamp}", "time_window_seconds": 60}}]},
+    {"tool_calls": [{"name": "search_runbooks", "args": {"query_text": "{error_message}"}}]},
+    {"text": "Root cause: repeated errors in {service} around {timestamp} ({error_message}). "
+             "Remediation: follow the retrieved runbook; e.g. `kubectl rollout restart deployment {service}`."},
+]
+
+
+def _fill(value, alert):
+    if isinstance(value, str):
+        try:
+            return value.format(**alert)
+        except (KeyError, IndexError, ValueError):
+            return value
+    if isinstance(value, dict):
+        return {key: _fill(item, alert) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_fill(item, alert) for item in value]
+    return value
+
+
+class ScriptedSession(LLMSession):
+    """
+    Reports input tokens as the estimated size of the whole conversation so far (what
+    a real model would be sent), whatever the recording says.
+    """
+
+    def __init__(self, script, alert, latency_ms, jitter_ms, ms_per_1k_tokens=0.0, context=""):
+        self.script = script
+        self.alert = alert or {}
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.ms_per_1k_tokens = ms_per_1k_tokens
+        self.context_tokens = estimate_tokens(context)
+        self.turn = 0
+
+    async def send(self, message):
+        self.context_tokens += estimate_tokens(message)
+        if self.turn == 0 and PREFETCHED_EVIDENCE_HEADER in message:
+            # Like a real model handed the evidence: skip the opening steps that only fetch it
+            while self.turn < len(self.script) - 1 and self._only_prefetched_tools(self.script[self.turn]):
+                self.turn += 1
+        return await self._next()
+
+    @staticmethod
+    def _only_prefetched_tools(step):
+        calls = step.get("tool_calls", [])
+        return bool(calls) and all(call["name"] in PREFETCHED_TOOLS for call in calls)
+
+    async def send_tool_results(self, results):
+        self.context_tokens += sum(estimate_tokens(result) for _, result in results)
+        return await self._next()
+
+    async def _next(self):
+        delay_ms = (self.latency_ms + random.uniform(0, self.jitter_ms)
+                    + self.ms_per_1k_tokens * self.context_tokens / 1000)
+        if delay_ms:
+            await asyncio.sleep(delay_ms / 1000)
+
+        if self.turn >= len(self.script):
+            return LLMResponse(text="Scripted conversation ended.")
+        step = _fill(self.script[self.turn], self.alert)
+        self.turn += 1
+
+        text = step.get("text", "")
+        tool_calls = [ToolCall(call["name"], call.get("args", {})) for call in step.get("tool_calls", [])]
+        output_tokens = step.get("output_tokens") or estimate_tokens(
+            text + "".join(json.dumps(call.args) for call in tool_calls)
+        )
+        input_tokens = self.context_tokens
+        self.context_tokens += output_tokens  # The reply stays in the conversation
+        return LLMResponse(text=text, tool_calls=tool_calls, input_tokens=input_tokens, output_tokens=output_tokens)
+
+
+class ScriptedProvider(LLMProvider):
+    """
+    Replays a recorded conversation with configurable latency; needs no network access.
+    LLM_SCRIPT_FILE may hold one script (a JSON list of steps) or a JSONL file of
+    recordings, which are replayed round-robin.
+    """
+    name = "scripted"
+
+    def __init__(self, script_file=LLM_SCRIPT_FILE, latency_ms=LLM_SCRIPTED_LATENCY_MS,
+                 jitter_ms=LLM_SCRIPTED_JITTER_MS, ms_per_1k_tokens=LLM_SCRIPTED_MS_PER_1K_TOKENS):
+        self.scripts = [DEFAULT_SCRIPT]
+        if script_file:
+            with open(script_file, "r") as f:
+                content = f.read().strip()
+            if content.startswith("["):
+                self.scripts = [json.loads(content)]
+            else:
+                self.scripts = [json.loads(line) for line in content.splitlines() if line.strip()]
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.ms_per_1k_tokens = ms_per_1k_tokens
+        self._sessions = 0
+
+    def start_session(self, system_prompt, tools, alert=None):
+        script = self.scripts[self._sessions % len(self.scripts)]
+        self._sessions += 1
+        return ScriptedSession(script, alert, self.latency_ms, self.jitter_ms, self.ms_per_1k_tokens,
+                               context=system_prompt + json.dumps(tools))
+
+
+# --- RECORDING ---
+
+class RecordingSession(LLMSession):
+    """
+    Wraps a real session and writes its replies as a replayable script when the
+    conversation ends (a reply with no tool calls).
+    """
+
+    def __init__(self, session, record_file):
+        self.session = session
+        self.record_file = record_file
+        self.steps = []
+
+    async def send(self, message):
+        return self._record(await self.session.send(message))
+
+    async def send_tool_results(self, results):
+        return self._record(await self.session.send_tool_results(results))
+
+    def _record(self, response):
+        step = {"input_tokens": response.input_tokens, "output_tokens": response.output_tokens}
+        if response.tool_calls:
+            step["tool_calls"] = [{"name": call.name, "args": call.args} for call in response.tool_calls]
+        if response.text:
+            step["text"] = response.text
+        self.steps.append(step)
+
+        if not response.tool_calls:
+            with open(self.record_file, "a") as f:
+                f.write(json.dumps(self.steps) + "\n")
+        return response
+
+
+class RecordingProvider(LLMProvider):
+    def __init__(self, provider, record_file):
+        self.provider = provider
+        self.name = provider.name
+        self.record_file = record_file
+
+    def start_session(self, system_prompt, tools, alert=None):
+        return RecordingSession(self.provider.start_session(system_prompt, tools, alert), self.record_file)
+
+
+PROVIDERS = {
+    "gemini": GeminiProvider,
+    "openai": OpenAIProvider,
+    "scripted": ScriptedProvider,
+}
+
+_provider = None
+
+
+def get_llm_provider():
+    """
+    Returns the process-wide provider selected by LLM_PROVIDER (built on first use).
+    """
+    global _provider
+    if _provider is None:
+        if LLM_PROVIDER not in PROVIDERS:
+            raise ValueError(f"Unknown LLM_PROVIDER '{LLM_PROVIDER}'. Choose one of: {', '.join(PROVIDERS)}")
+        provider = PROVIDERS[LLM_PROVIDER]()
+        if LLM_RECORD_FILE and LLM_PROVIDER != "scripted":
+            provider = RecordingProvider(provider, LLM_RECORD_FILE)
+        _provider = provider
+    return _provider
@@ -0,0 +1,277 @@
+import os
+import mmap
+import struct
+import fcntl
+import datetime
+import tempfile
+
+# --- SIDECAR TIME INDEX FOR APPEND-ONLY LOG FILES ---
+# Layout of "<log_file>.idx":
+#   header : magic, bucket size (seconds), log inode, number of log bytes already indexed
+#   entries: (bucket_epoch, byte_offset) pairs, one per bucket, in file order.
+# An entry means "the first line of this bucket starts at this byte offset", so a
+# query only has to binary search the entries and read the bytes in its window.
+
+INDEX_MAGIC = b"FLIDX001"
+BUCKET_SECONDS = int(os.environ.get("LOG_INDEX_BUCKET_SECONDS", 10))
+INDEX_DIR = os.environ.get("LOG_INDEX_DIR")  # Optional: keep indexes off a read-only log volume
+# Used when the index can't be written next to the log (e.g. a read-only volume)
+FALLBACK_INDEX_DIR = os.path.join(tempfile.gettempdir(), "fireline-log-index")
+
+_HEADER = struct.Struct("<8sqqq")
+_ENTRY = struct.Struct("<qq")
+
+
+# Timestamp prefix ("YYYY-MM-DDTHH:MM:SSZ") -> epoch seconds, and the same per minute.
+# Log lines arrive mostly in time order and many share a second, so these stay
+# small and turn almost every parse into a single slice + dict lookup.
+_second_epochs = {}
+_minute_epochs = {}
+_MAX_CACHED_PREFIXES = 4096
+
+
+def _days_from_civil(year, month, day):
+    # Days since 1970-01-01 in the proleptic Gregorian calendar (Howard Hinnant's algorithm)
+    year -= month <= 2
+    era = year // 400
+    year_of_era = year - era * 400
+    day_of_year = (153 * (month + (-3 if month > 2 else 9)) + 2) // 5 + day - 1
+    day_of_era = year_of_era * 365 + year_of_era // 4 - year_of_era // 100 + day_of_year
+    return era * 146097 + day_of_era - 719468
+
+
+def _slow_line_epoch(line):
+    """
+    General ISO-8601 parser for lines that don't use the fixed "YYYY-MM-DDTHH:MM:SSZ" prefix.
+    """
+    try:
+        log_timestamp_str = line.split(b'Z', 1)[0].decode("ascii")
+        log_time = datetime.datetime.fromisoformat(log_timestamp_str + '+00:00')
+        return int(log_time.timestamp())
+    except (ValueError, IndexError, UnicodeDecodeError):
+        return None
+
+
+def _line_epoch(line):
+    """
+    Returns the epoch seconds of a raw log line, or None if it has no timestamp.
+    """
+    epoch = _second_epochs.get(line[:20])
+    if epoch is not None:
+        return epoch
+
+    epoch = _parse_line_epoch(line)
+    if epoch is not None and len(line) >= 20 and line[19] == 90:
+        if len(_second_epochs) >= _MAX_CACHED_PREFIXES:
+            _second_epochs.clear()
+        _second_epochs[line[:20]] = epoch
+    return epoch
+
+
+def _parse_line_epoch(line):
+    # Fast path: "YYYY-MM-DDTHH:MM:SSZ". Checks the separators by byte value
+    # (- = 45, T = 84, : = 58, Z = 90) and never builds a datetime.
+    if len(line) >= 20 and line[19] == 90 and line[16] == 58 and line[10] == 84:
+        base = _minute_epochs.get(line[:16])
+        if base is None:
+            if line[4] != 45 or line[7] != 45 or line[13] != 58:
+                return _slow_line_epoch(line)
+            fields = (line[0:4], line[5:7], line[8:10], line[11:13], line[14:16])
+            # int() would also take " 1", "_1" or "+1"; the ISO parser takes none of them
+            if not all(field.isdigit() for field in fields):
+                return _slow_line_epoch(line)
+            year, month, day, hour, minute = map(int, fields)
+            if hour > 23 or minute > 59:
+                return None
+            try:
+                datetime.date(year, month, day)  # Only on a cache miss, so this stays cheap
+            except ValueError:
+                return None
+            base = _days_from_civil(year, month, day) * 86400 + hour * 3600 + minute * 60
+            if len(_minute_epochs) >= _MAX_CACHED_PREFIXES:
+                _minute_epochs.clear()
+            _minute_epochs[line[:16]] = base
+
+        second = line[17:19]
+        if second.isdigit():
+            second = int(second)
+            return base + second if second <= 59 else None  # Same range the ISO parser accepts
+
+    return _slow_line_epoch(line)
+
+
+class LogIndex:
+    """
+    Incrementally built bucket -> byte offset index for one log file.
+    """
+
+    def __init__(self, log_file, bucket_seconds=BUCKET_SECONDS):
+        self.log_file = log_file
+        self.bucket_seconds = bucket_seconds
+        if INDEX_DIR:
+            self.index_file = self._index_in(INDEX_DIR)
+        else:
+            self.index_file = log_file + ".idx"
+
+    def _index_in(self, directory):
+        name = os.path.abspath(self.log_file).strip(os.sep).replace(os.sep, "_")
+        return os.path.join(directory, name + ".idx")
+
+    def _open_index(self):
+        """
+        Opens (creating) the index file. If it can't be written where it is configured,
+        falls back to FALLBACK_INDEX_DIR; if that fails too, returns None and queries
+        scan the whole log.
+        """
+        try:
+            return os.open(self.index_file, os.O_RDWR | os.O_CREAT, 0o644)
+        except OSError:
+            fallback = self._index_in(FALLBACK_INDEX_DIR)
+            if self.index_file == fallback:
+                self.index_file = None
+                return None
+        try:
+            os.makedirs(FALLBACK_INDEX_DIR, exist_ok=True)
+            fd = os.open(fallback, os.O_RDWR | os.O_CREAT, 0o644)
+        except OSError as e:
+            print(f"--- ⚠️ Log index: can't write an index for {self.log_file} ({e}); scanning linearly ---")
+            self.index_file = None
+            return None
+        self.index_file = fallback
+        return fd
+
+    # --- BUILDING ---
+
+    def refresh(self):
+        """
+        Indexes any bytes appended to the log since the last refresh.
+        Rebuilds from scratch if the log was truncated/rotated or the bucket size changed.
+        """
+        log_stat = os.stat(self.log_file)
+        log_size = log_stat.st_size
+        self._inode = log_stat.st_ino
+
+        fd = self._open_index()
+        if fd is None:
+            return
+        with os.fdopen(fd, "r+b") as idx:
+            # Only one writer at a time; readers never see a half-written entry
+            # because the header (indexed bytes) is updated last.
+            fcntl.flock(idx, fcntl.LOCK_EX)
+            try:
+                indexed_upto, last_bucket = self._read_state(idx)
+                if indexed_upto > log_size:
+                    indexed_upto, last_bucket = self._reset(idx)
+                if indexed_upto == log_size:
+                    return
+
+                new_entries = []
+                offset = indexed_upto
+                with open(self.log_file, "rb") as log:
+                    log.seek(indexed_upto)
+                    for line in log:
+                        if not line.endswith(b"\n"):
+                            break  # Partial line still being written; pick it up next time
+                        epoch = _line_epoch(line)
+                        if epoch is not None:
+                            bucket = epoch - epoch % self.bucket_seconds
+                            if last_bucket is None or bucket > last_bucket:
+                                new_entries.append(_ENTRY.pack(bucket, offset))
+                                last_bucket = bucket
+                        offset += len(line)
+
+                idx.seek(0, os.SEEK_END)
+                idx.write(b"".join(new_entries))
+                idx.flush()
+                idx.seek(0)
+                idx.write(_HEADER.pack(INDEX_MAGIC, self.bucket_seconds, self._inode, offset))
+                idx.flush()
+            finally:
+                fcntl.flock(idx, fcntl.LOCK_UN)
+
+    def _read_state(self, idx):
+        idx.seek(0)
+        header = idx.read(_HEADER.size)
+        if len(header) < _HEADER.size:
+            return self._reset(idx)
+
+        magic, bucket_seconds, inode, indexed_upto = _HEADER.unpack(header)
+        if magic != INDEX_MAGIC or bucket_seconds != self.bucket_seconds or inode != self._inode:
+            return self._reset(idx)
+
+        size = idx.seek(0, os.SEEK_END)
+        n_entries = (size - _HEADER.size) // _ENTRY.size
+        if n_entries == 0:
+            return indexed_upto, None
+        idx.seek(_HEADER.size + (n_entries - 1) * _ENTRY.size)
+        last_bucket, _ = _ENTRY.unpack(idx.read(_ENTRY.size))
+        return indexed_upto, last_bucket
+
+    def _reset(self, idx):
+        idx.truncate(0)
+        idx.seek(0)
+        idx.write(_HEADER.pack(INDEX_MAGIC, self.bucket_seconds, self._inode, 0))
+        idx.flush()
+        return 0, None
+
+    # --- QUERYING ---
+
+    def window_offsets(self, start_epoch, end_epoch):
+        """
+        Returns the (start, end) byte range of the log that can contain lines
+        between start_epoch and end_epoch, using a binary search over the index.
+        end is None when the window reaches the end of the file.
+        """
+        if self.index_file is None:
+            return 0, None  # No index could be written: scan the whole log
+        with open(self.index_file, "rb") as idx:
+            if os.fstat(idx.fileno()).st_size <= _HEADER.size:
+                return 0, None
+            with mmap.mmap(idx.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                n_entries = (len(mm) - _HEADER.size) // _ENTRY.size
+
+                def entry(i):
+                    return _ENTRY.unpack_from(mm, _HEADER.size + i * _ENTRY.size)
+
+                start_bucket = start_epoch - start_epoch % self.bucket_seconds
+                end_bucket = end_epoch - end_epoch % self.bucket_seconds
+
+                # Last entry with bucket <= start_bucket
+                i = self._bisect_right(entry, n_entries, start_bucket) - 1
+                start = entry(i)[1] if i >= 0 else 0
+
+                # First entry with bucket > end_bucket. If there is none, the window
+                # runs to the end of the file, including a not-yet-indexed tail.
+                j = self._bisect_right(entry, n_entries, end_bucket)
+                end = entry(j)[1] if j < n_entries else None
+
+        return start, end
+
+    @staticmethod
+    def _bisect_right(entry, n_entries, bucket):
+        lo, hi = 0, n_entries
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if entry(mid)[0] <= bucket:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def read_window(self, start_epoch, end_epoch):
+        """
+        Yields the raw lines (bytes) in the window. Cost depends on the window size,
+        not on the size of the log file.
+        """
+        start, end = self.window_offsets(start_epoch, end_epoch)
+        if end is not None and start >= end:
+            return
+
+        with open(self.log_file, "rb") as log:
+            log.seek(start)
+            position = start
+            for line in log:
+                if end is not None and position >= end:
+                    break
+                position += len(line)
+                yield line
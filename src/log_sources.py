@@ -0,0 +1,247 @@
+import io
+import os
+import re
+import glob
+import gzip
+import heapq
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from src.log_index import LogIndex, _line_epoch
+
+try:
+    import zstandard
+except ImportError:  # Only needed when .zst segments are present
+    zstandard = None
+
+# --- LOG SOURCE CONFIGURATION ---
+# Comma-separated glob templates; "{service}" is replaced by the alert's service name.
+# The defaults cover one directory per service (with one subdirectory per pod) and
+# rotated segments such as auth-service.log.1, auth-service.log.2.gz, ....log.3.zst
+LOG_ROOT = os.environ.get("LOG_ROOT", "logs")
+LOG_SOURCE_PATTERNS = os.environ.get(
+    "LOG_SOURCE_PATTERNS",
+    "{root}/{service}/*.log*,{root}/{service}/*/*.log*,{root}/{service}.log*",
+)
+# The POC ships a single mock log; use it when a service has no configured segments.
+DEFAULT_LOG_FILE = os.environ.get("DEFAULT_LOG_FILE", "mock_service.log")
+LOG_SCAN_WORKERS = int(os.environ.get("LOG_SCAN_WORKERS", os.cpu_count() or 1))
+
+# How much of the end of a plain segment we read to find its last timestamp
+_TAIL_BYTES = 64 * 1024
+
+# path -> (size, mtime_ns, first_epoch, last_epoch)
+_segment_ranges = {}
+_scan_pool = None
+
+
+def resolve_segments(service):
+    """
+    Returns every log segment (plain, rotated, .gz, .zst) for a service across all pods.
+    """
+    segments = set()
+    for template in LOG_SOURCE_PATTERNS.split(","):
+        pattern = template.strip().format(root=LOG_ROOT, service=service)
+        for path in glob.glob(pattern):
+            if os.path.isfile(path) and not path.endswith(".idx"):
+                segments.add(path)
+
+    if not segments and os.path.exists(DEFAULT_LOG_FILE):
+        segments.add(DEFAULT_LOG_FILE)
+    return sorted(segments)
+
+
+def _is_compressed(path):
+    return path.endswith(".gz") or path.endswith(".zst")
+
+
+def _open_segment(path):
+    """
+    Opens a segment as a binary line iterator, decompressing on the fly.
+    """
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    if path.endswith(".zst"):
+        if zstandard is None:
+            raise RuntimeError(f"Cannot read {path}: the 'zstandard' package is not installed.")
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True))
+    return open(path, "rb")
+
+
+# --- TIME RANGE CACHE ---
+
+def _plain_time_range(path):
+    first = last = None
+    with open(path, "rb") as f:
+        for line in f:
+            first = _line_epoch(line)
+            if first is not None:
+                break
+        size = f.seek(0, os.SEEK_END)
+        f.seek(max(0, size - _TAIL_BYTES))
+        for line in reversed(f.read().splitlines()):
+            last = _line_epoch(line)
+            if last is not None:
+                break
+    return first, last
+
+
+def segment_time_range(path):
+    """
+    Returns the cached (first_epoch, last_epoch) of a segment, or (None, None) if unknown.
+    Plain files are measured from their head and tail. Compressed segments are
+    measured as a side effect of their first scan.
+    """
+    stat = os.stat(path)
+    cached = _segment_ranges.get(path)
+    if cached and cached[:2] == (stat.st_size, stat.st_mtime_ns):
+        return cached[2], cached[3]
+
+    if _is_compressed(path):
+        return None, None
+
+    first, last = _plain_time_range(path)
+    _segment_ranges[path] = (stat.st_size, stat.st_mtime_ns, first, last)
+    return first, last
+
+
+def _may_overlap(path, start_epoch, end_epoch):
+    first, last = segment_time_range(path)
+    if first is None or last is None:
+        return True  # Unknown range; we have to look inside
+    return first <= end_epoch and last >= start_epoch
+
+
+# --- MATCHING ---
+
+def _filter_lines(lines, start_epoch, end_epoch, level_tokens, regex):
+    for raw_line in lines:
+        if not any(token in raw_line for token in level_tokens):
+            continue # Skip lines that aren't at the requested level, this is fast.
+
+        log_epoch = _line_epoch(raw_line)
+        if log_epoch is None:
+            # This log line has a malformed date, skip it.
+            continue
+        if not start_epoch <= log_epoch <= end_epoch:
+            continue
+
+        line = raw_line.decode("utf-8", errors="replace").strip()
+        if regex and not regex.search(line):
+            continue
+
+        yield log_epoch, line
+
+
+def iter_log_matches(start_time, end_time, log_file="mock_service.log", levels=("ERROR",), pattern=None):
+    """
+    Lazily yields (epoch, line) for log lines in [start_time, end_time] that match
+    one of the severity levels and, optionally, a regex pattern.
+    """
+    level_tokens = [level.encode() for level in levels]
+    regex = re.compile(pattern) if isinstance(pattern, str) else pattern
+    start_epoch = start_time.timestamp()
+    end_epoch = end_time.timestamp()
+
+    if _is_compressed(log_file):
+        # Compressed segments can't be seeked into; stream the whole thing.
+        with _open_segment(log_file) as f:
+            yield from _filter_lines(f, start_epoch, end_epoch, level_tokens, regex)
+        return
+
+    # Only read the bytes inside the window, using the sidecar time index.
+    # The index narrows to whole buckets, so _filter_lines checks the exact window.
+    index = LogIndex(log_file)
+    index.refresh()
+    lines = index.read_window(int(start_epoch), int(end_epoch))
+    yield from _filter_lines(lines, start_epoch, end_epoch, level_tokens, regex)
+
+
+def _collapse(matches, max_signatures):
+    """
+    Collapses (epoch, line) matches into (first_epoch, first_line, count) per distinct
+    message, keeping the max_signatures most frequent, in timestamp order.
+    """
+    collapsed = {}
+    for log_epoch, line in matches:
+        signature = line.split(' ', 1)[-1]
+        if signature in collapsed:
+            collapsed[signature][2] += 1
+        else:
+            collapsed[signature] = [log_epoch, line, 1]
+    entries = collapsed.values()
+    if len(collapsed) > max_signatures:
+        entries = heapq.nlargest(max_signatures, entries, key=lambda entry: entry[2])
+    return sorted((tuple(entry) for entry in entries), key=lambda entry: entry[0])
+
+
+def _scan_segment(path, start_time, end_time, levels, pattern, max_signatures):
+    """
+    Runs in a pool process. Returns the collapsed matches of one segment plus the
+    first/last timestamps seen when the whole segment had to be read.
+    """
+    if not _is_compressed(path):
+        matches = iter_log_matches(start_time, end_time, path, levels=levels, pattern=pattern)
+        return path, _collapse(matches, max_signatures), None
+
+    # For compressed segments, record the time range while streaming so the next
+    # search can skip this segment without decompressing it.
+    seen = {"first": None, "last_line": b""}
+
+    def tracked(lines):
+        for raw_line in lines:
+            if seen["first"] is None:
+                seen["first"] = _line_epoch(raw_line)
+            if raw_line[:1].isdigit():
+                seen["last_line"] = raw_line
+            yield raw_line
+
+    level_tokens = [level.encode() for level in levels]
+    regex = re.compile(pattern) if pattern else None
+    with _open_segment(path) as f:
+        matches = _filter_lines(tracked(f), start_time.timestamp(), end_time.timestamp(), level_tokens, regex)
+        collapsed = _collapse(matches, max_signatures)
+    return path, collapsed, (seen["first"], _line_epoch(seen["last_line"]))
+
+
+def _get_scan_pool():
+    global _scan_pool
+    if _scan_pool is None:
+        # "spawn" keeps pool processes independent of the worker's threads and sockets
+        _scan_pool = ProcessPoolExecutor(
+            max_workers=LOG_SCAN_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _scan_pool
+
+
+def search_service_logs(service, start_time, end_time, levels=("ERROR",), pattern=None, max_signatures=10000):
+    """
+    Searches every segment of a service in parallel and yields the collapsed
+    (epoch, line, count) matches merged in timestamp order.
+    """
+    if pattern:
+        re.compile(pattern)  # Fail fast on a bad pattern, before fanning out
+
+    segments = resolve_segments(service)
+    start_epoch, end_epoch = start_time.timestamp(), end_time.timestamp()
+    candidates = [path for path in segments if _may_overlap(path, start_epoch, end_epoch)]
+    print(f"--- 🛠️ Tool: Scanning {len(candidates)}/{len(segments)} log segment(s) for {service} ---")
+
+    if not candidates:
+        return iter(())
+
+    args = (start_time, end_time, tuple(levels), pattern, max_signatures)
+    if len(candidates) == 1:
+        results = [_scan_segment(candidates[0], *args)]
+    else:
+        pool = _get_scan_pool()
+        futures = [pool.submit(_scan_segment, path, *args) for path in candidates]
+        results = [future.result() for future in futures]
+
+    for path, _, time_range in results:
+        if time_range is not None:
+            stat = os.stat(path)
+            _segment_ranges[path] = (stat.st_size, stat.st_mtime_ns, *time_range)
+
+    return heapq.merge(*(collapsed for _, collapsed, _ in results), key=lambda entry: entry[0])
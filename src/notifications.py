@@ -1,9 +1,192 @@
 import os
+import random
+import asyncio
 import requests
 
+# --- NOTIFICATIONS ---
+# Workers deliver through NotificationDispatcher (the send_notification activity),
+# off the investigation's critical path: one pooled keep-alive HTTP client, messages
+# to the same channel coalesced into one post, a per-channel rate limit, and retries
+# with backoff (honouring Retry-After). post_to_slack() remains for one-off scripts.
+
+NOTIFY_BATCH_WINDOW_SECONDS = float(os.getenv("NOTIFY_BATCH_WINDOW_SECONDS", 1.0))
+NOTIFY_MAX_BATCH = int(os.getenv("NOTIFY_MAX_BATCH", 10))
+NOTIFY_MAX_BATCH_CHARS = 30000  # Slack truncates longer messages
+# Slack allows about one message per second per incoming webhook
+NOTIFY_MIN_INTERVAL_SECONDS = float(os.getenv("NOTIFY_MIN_INTERVAL_SECONDS", 1.0))
+NOTIFY_MAX_ATTEMPTS = int(os.getenv("NOTIFY_MAX_ATTEMPTS", 5))
+NOTIFY_TIMEOUT_SECONDS = float(os.getenv("NOTIFY_TIMEOUT_SECONDS", 10))
+
+
+class NotificationError(Exception):
+    pass
+
+
+def format_summary(summary, title="Fireline Investigation Complete"):
+    # Slack's "Incoming Webhooks" expect a JSON payload with a "text" key.
+    # We'll format it nicely using Markdown's "block quote".
+    quoted = summary.replace("\n", "\n> ")
+    return f"🔥 *{title}* 🔥\n\n> {quoted}"
+
+
+def webhook_for(channel=None):
+    """
+    The webhook URL for a channel (e.g. a service name), falling back to SLACK_WEBHOOK_URL.
+    SLACK_CHANNEL_WEBHOOKS optionally maps channels to their own webhooks:
+    "auth-service=https://hooks.slack.com/...,payments=https://..."
+    """
+    channels = os.getenv("SLACK_CHANNEL_WEBHOOKS", "")
+    for item in filter(None, (part.strip() for part in channels.split(","))):
+        name, _, url = item.partition("=")
+        if name.strip() == channel:
+            return url.strip()
+    return os.getenv("SLACK_WEBHOOK_URL")
+
+
+class NotificationDispatcher:
+    def __init__(self, batch_window=NOTIFY_BATCH_WINDOW_SECONDS, max_batch=NOTIFY_MAX_BATCH,
+                 min_interval=NOTIFY_MIN_INTERVAL_SECONDS, max_attempts=NOTIFY_MAX_ATTEMPTS,
+                 timeout=NOTIFY_TIMEOUT_SECONDS):
+        import httpx
+
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.min_interval = min_interval
+        self.max_attempts = max_attempts
+        # One client for every channel: connections are kept alive between posts
+        self._client = httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+        )
+        self._httpx = httpx
+        self._queues = {}  # webhook URL -> asyncio.Queue of (text, future)
+        self._workers = {}
+        self.sent = 0
+        self.coalesced = 0
+        self.retries = 0
+        self.failed = 0
+
+    async def send(self, text, channel=None):
+        """
+        Queues a message and waits until the batch carrying it is delivered.
+        Raises NotificationError if it couldn't be delivered.
+        """
+        url = webhook_for(channel)
+        if not url:
+            print("--- ❌ Scribe Error: SLACK_WEBHOOK_URL is not set. Cannot post. ---")
+            return False
+
+        if url not in self._queues:
+            self._queues[url] = asyncio.Queue()
+            self._workers[url] = asyncio.create_task(self._channel_worker(url, self._queues[url]))
+        future = asyncio.get_running_loop().create_future()
+        await self._queues[url].put((text, future))
+        return await future
+
+    async def _channel_worker(self, url, queue):
+        last_sent = 0.0
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await queue.get()]
+
+            # Coalesce whatever else arrives for this channel within the window
+            deadline = loop.time() + self.batch_window
+            size = len(batch[0][0])
+            while len(batch) < self.max_batch and size < NOTIFY_MAX_BATCH_CHARS:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    break
+                batch.append(item)
+                size += len(item[0])
+
+            # Per-channel rate limit
+            wait = last_sent + self.min_interval - loop.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+
+            try:
+                await self._deliver(url, "\n\n───\n\n".join(text for text, _ in batch))
+                self.sent += 1
+                self.coalesced += len(batch) - 1
+                for _, future in batch:
+                    if not future.done():
+                        future.set_result(True)
+            except Exception as e:
+                self.failed += len(batch)
+                print(f"--- ❌ Scribe Error: Giving up on {len(batch)} message(s): {e} ---")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(NotificationError(str(e)))
+            last_sent = loop.time()
+
+    async def _deliver(self, url, text):
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                response = await self._client.post(url, json={"text": text})
+            except self._httpx.HTTPError as e:
+                if attempt == self.max_attempts:
+                    raise NotificationError(f"Network error while posting to Slack: {e}")
+                delay = self._backoff(attempt)
+            else:
+                if response.status_code < 300:
+                    return
+                if response.status_code != 429 and response.status_code < 500:
+                    # Bad URL or payload: retrying won't help
+                    raise NotificationError(f"Slack returned status code {response.status_code}: {response.text}")
+                if attempt == self.max_attempts:
+                    raise NotificationError(f"Slack returned status code {response.status_code} after {attempt} attempts")
+                retry_after = response.headers.get("Retry-After")
+                delay = float(retry_after) if retry_after and retry_after.isdigit() else self._backoff(attempt)
+
+            self.retries += 1
+            await asyncio.sleep(delay)
+
+    @staticmethod
+    def _backoff(attempt):
+        # Exponential with full jitter: 0.5s, 1s, 2s, ... capped at 30s
+        return random.uniform(0, min(30.0, 0.5 * 2 ** (attempt - 1)))
+
+    def metrics(self):
+        return {
+            "channels": len(self._queues),
+            "queued": sum(queue.qsize() for queue in self._queues.values()),
+            "sent": self.sent,
+            "coalesced": self.coalesced,
+            "retries": self.retries,
+            "failed": self.failed,
+        }
+
+    async def close(self):
+        for task in self._workers.values():
+            task.cancel()
+        await asyncio.gather(*self._workers.values(), return_exceptions=True)
+        await self._client.aclose()
+
+
+_dispatcher = None
+
+
+def get_notification_dispatcher():
+    global _dispatcher
+    if _dispatcher is None:
+        _dispatcher = NotificationDispatcher()
+    return _dispatcher
+
+
+async def close_notification_dispatcher():
+    global _dispatcher
+    if _dispatcher is not None:
+        await _dispatcher.close()
+        _dispatcher = None
+
+
 def post_to_slack(summary):
     """
-    Posts a message to a Slack channel using a webhook URL.
+    Posts a message to a Slack channel using a webhook URL (blocking; for scripts).
     """
     print(f"--- 🚀 Scribe Agent: Posting summary to Slack... ---")
 
@@ -17,15 +200,11 @@ def post_to_slack(summary):
         return
 
     # 3. Format the message for Slack's API
-    # Slack's "Incoming Webhooks" expect a JSON payload with a "text" key.
-    # We'll format it nicely using Markdown's "block quote".
-    payload = {
-        "text": f"🔥 *Fireline Investigation Complete* 🔥\n\n> {summary.replace('\n', '\n> ')}"
-    }
+    payload = {"text": format_summary(summary)}
 
     # 4. Make the network request with error handling
     try:
-        response = requests.post(webhook_url, json=payload)
+        response = requests.post(webhook_url, json=payload, timeout=NOTIFY_TIMEOUT_SECONDS)
 
         # Check for a successful HTTP status code (e.g., 200)
         if response.status_code == 200:
@@ -37,4 +216,4 @@ def post_to_slack(summary):
 
     except requests.exceptions.RequestException as e:
         # This catches network errors (e.g., you're offline)
-        print(f"--- ❌ Scribe Error: Network error while posting to Slack: {e} ---")
\ No newline at end of file
+        print(f"--- ❌ Scribe Error: Network error while posting to Slack: {e} ---")
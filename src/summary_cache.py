@@ -0,0 +1,75 @@
+import os
+import threading
+from collections import OrderedDict
+
+# --- WORKFLOW SUMMARY CACHE ---
+# The analysis endpoint used to query Temporal on every call. A query against a
+# workflow that has been evicted from the worker's cache (or has already closed)
+# replays its whole history. The workflow bumps summary_version whenever its summary
+# changes and record_incident writes that version to the incident store, so the API
+# can tell from one indexed row whether its cached copy is still current.
+
+SUMMARY_CACHE_SIZE = int(os.environ.get("SUMMARY_CACHE_SIZE", 2048))
+# Queries slower than this almost always replayed history on the worker
+QUERY_REPLAY_THRESHOLD_MS = float(os.environ.get("QUERY_REPLAY_THRESHOLD_MS", 250))
+
+
+class SummaryCache:
+    """
+    LRU of workflow_id -> (summary_version, summary).
+    """
+
+    def __init__(self, max_entries=SUMMARY_CACHE_SIZE, replay_threshold_ms=QUERY_REPLAY_THRESHOLD_MS):
+        self.max_entries = max_entries
+        self.replay_threshold_ms = replay_threshold_ms
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0  # Misses where the cached copy had a different summary_version
+        self.queries = 0
+        self.replays = 0
+        self.query_ms_total = 0.0
+
+    def get(self, workflow_id, version):
+        """
+        The cached summary if it was cached at exactly `version`, else None. (Equality,
+        not >=: a reopened incident starts a new run whose versions count from 0 again.)
+        """
+        with self._lock:
+            entry = self._entries.get(workflow_id)
+            if entry and version is not None and entry[0] == version:
+                self._entries.move_to_end(workflow_id)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            if entry:
+                self.stale += 1
+            return None
+
+    def put(self, workflow_id, version, summary):
+        with self._lock:
+            self._entries[workflow_id] = (version, summary)
+            self._entries.move_to_end(workflow_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def record_query(self, elapsed_ms):
+        with self._lock:
+            self.queries += 1
+            self.query_ms_total += elapsed_ms
+            if elapsed_ms >= self.replay_threshold_ms:
+                self.replays += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "temporal_queries": self.queries,
+            "replays": self.replays,
+            "avg_query_ms": round(self.query_ms_total / self.queries, 1) if self.queries else 0.0,
+            "size": len(self._entries),
+        }
@@ -0,0 +1,10 @@
+# --- TASK QUEUES ---
+# Workflows, LLM-bound investigations, cheap tool/IO activities and remediation
+# each get their own queue, so they don't compete for the same worker slots and
+# each tier can be scaled on its own (see src/worker_profiles.py).
+# Kept free of imports: the workflow sandbox imports this module.
+
+WORKFLOW_TASK_QUEUE = "fireline-task-queue"  # The API starts workflows here
+INVESTIGATION_TASK_QUEUE = "fireline-investigation"
+TOOLS_TASK_QUEUE = "fireline-tools"
+REMEDIATION_TASK_QUEUE = "fireline-remediation"
@@ -0,0 +1,120 @@
+import os
+import time
+import asyncio
+import functools
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+from temporalio import activity
+
+# --- TOOL EXECUTION LAYER ---
+# Blocking tools (file I/O, synchronous HTTP) run on a sized thread pool instead of
+# the worker's event loop, so one slow log scan can't freeze every other activity.
+# Each tool also gets its own concurrency limit and timeout, and the calling
+# activity keeps heartbeating while it waits.
+
+TOOL_EXECUTOR_THREADS = int(os.environ.get("TOOL_EXECUTOR_THREADS", 16))
+TOOL_HEARTBEAT_SECONDS = float(os.environ.get("TOOL_HEARTBEAT_SECONDS", 5))
+
+
+def _parse_limits(value, cast):
+    """
+    "search_logs=4,search_runbooks=8" -> {"search_logs": 4, "search_runbooks": 8}
+    """
+    limits = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        name, _, limit = item.partition("=")
+        limits[name.strip()] = cast(limit)
+    return limits
+
+
+TOOL_CONCURRENCY = {
+    "search_logs": 4,
+    "search_runbooks": 8,
+    **_parse_limits(os.environ.get("TOOL_CONCURRENCY", ""), int),
+}
+TOOL_TIMEOUTS = {
+    "search_logs": 120.0,
+    "search_runbooks": 30.0,
+    **_parse_limits(os.environ.get("TOOL_TIMEOUTS", ""), float),
+}
+DEFAULT_TOOL_CONCURRENCY = 4
+DEFAULT_TOOL_TIMEOUT = 60.0
+
+# The calling activity's latest heartbeat details (e.g. its resume checkpoint).
+# Tool heartbeats carry them along: Temporal only keeps the last heartbeat, and a
+# retry must not lose the checkpoint to a bare "still running" ping.
+heartbeat_details = contextvars.ContextVar("heartbeat_details", default={})
+
+
+class ToolTimeoutError(Exception):
+    pass
+
+
+class ToolExecutor:
+    def __init__(self, max_workers=TOOL_EXECUTOR_THREADS, concurrency=TOOL_CONCURRENCY, timeouts=TOOL_TIMEOUTS,
+                 heartbeat_seconds=TOOL_HEARTBEAT_SECONDS):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fireline-tool")
+        self.concurrency = concurrency
+        self.timeouts = timeouts
+        self.heartbeat_seconds = heartbeat_seconds
+        self._semaphores = {}
+
+    def _semaphore(self, name):
+        if name not in self._semaphores:
+            self._semaphores[name] = asyncio.Semaphore(self.concurrency.get(name, DEFAULT_TOOL_CONCURRENCY))
+        return self._semaphores[name]
+
+    async def run(self, name, fn, *args, **kwargs):
+        """
+        Runs a synchronous tool on the thread pool.
+        """
+        loop = asyncio.get_running_loop()
+        return await self._limited(name, lambda: loop.run_in_executor(self._pool, functools.partial(fn, *args, **kwargs)))
+
+    async def run_async(self, name, fn, *args, **kwargs):
+        """
+        Runs an async tool on the event loop, with the same limits and timeout.
+        """
+        return await self._limited(name, lambda: fn(*args, **kwargs))
+
+    async def _limited(self, name, start):
+        timeout = self.timeouts.get(name, DEFAULT_TOOL_TIMEOUT)
+        async with self._semaphore(name):
+            task = asyncio.ensure_future(start())
+            started = time.monotonic()
+            try:
+                while True:
+                    remaining = timeout - (time.monotonic() - started)
+                    if remaining <= 0:
+                        # A thread can't be killed; its result is simply discarded.
+                        task.cancel()
+                        raise ToolTimeoutError(f"{name} timed out after {timeout:.0f}s")
+
+                    done, _ = await asyncio.wait({task}, timeout=min(self.heartbeat_seconds, remaining))
+                    if done:
+                        return task.result()
+
+                    # Still running: tell Temporal we're alive so a long scan isn't mistaken for a hang
+                    if activity.in_activity():
+                        activity.heartbeat({
+                            **heartbeat_details.get(),
+                            "tool": name,
+                            "elapsed_seconds": round(time.monotonic() - started, 1),
+                        })
+            except asyncio.CancelledError:
+                task.cancel()
+                raise
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+_executor = None
+
+
+def get_tool_executor():
+    global _executor
+    if _executor is None:
+        _executor = ToolExecutor()
+    return _executor
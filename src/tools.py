@@ -1,20 +1,69 @@
 import os
-import psycopg
 import google.generativeai as genai
-from pgvector.psycopg import register_vector
 import datetime
+import re
+
+from src.db import get_pool
+from src.embeddings import embed_query_async, get_embedding_cache
+from src.log_sources import iter_log_matches, search_service_logs
 
 # Configure GenAI (we reuse the key from env)
 GOOGLE_API_KEY = os.environ.get("GOOGLE_API_KEY")
 if GOOGLE_API_KEY:
     genai.configure(api_key=GOOGLE_API_KEY)
 
-# DB Connection String
-DB_CONNECTION = os.environ.get("DB_CONNECTION")
+# Bounds on what a single search_logs call hands back to the agent
+MAX_LOG_RESULTS = int(os.environ.get("SEARCH_LOGS_MAX_RESULTS", 50))
+MAX_LOG_BYTES = int(os.environ.get("SEARCH_LOGS_MAX_BYTES", 8000))
+MAX_LOG_SIGNATURES = 10000  # Distinct messages each log segment reports back (the most frequent)
 
-def search_logs(timestamp_str, log_file="mock_service.log", time_window_seconds=60):
+def summarize_matches(matches, max_results=MAX_LOG_RESULTS, max_bytes=MAX_LOG_BYTES):
+    """
+    Collapses repeated messages into one line with a count and caps the payload
+    by number of entries and total bytes, keeping the most frequent messages.
     """
-    Searches a log file for ERROR lines within a time window around a given timestamp.
+    counts = {}
+    first_lines = {}
+
+    for match in matches:
+        # Matches are (epoch, line) or, when already collapsed, (epoch, line, count)
+        line = match[1]
+        count = match[2] if len(match) > 2 else 1
+
+        # The message without its timestamp identifies duplicates
+        signature = line.split(' ', 1)[-1]
+        if signature in counts:
+            counts[signature] += count
+        else:
+            counts[signature] = count
+            first_lines[signature] = line
+
+    # Most frequent first (ties keep timestamp order), so a dominant error that
+    # starts late in the window isn't crowded out by one-off lines
+    ranked = sorted(counts.items(), key=lambda item: -item[1])
+
+    summary = []
+    used_bytes = 0
+    for signature, count in ranked:
+        entry = first_lines[signature] if count == 1 else f"{first_lines[signature]} ×{count:,}"
+        if len(summary) >= max_results or used_bytes + len(entry) > max_bytes:
+            break
+        summary.append(entry)
+        used_bytes += len(entry)
+
+    omitted = len(counts) - len(summary)
+    if omitted:
+        summary.append(f"... {omitted:,} more matching message(s) omitted.")
+
+    return summary
+
+def search_logs(timestamp_str, log_file="mock_service.log", time_window_seconds=60,
+                levels=("ERROR",), pattern=None, max_results=MAX_LOG_RESULTS, max_bytes=MAX_LOG_BYTES,
+                service=None):
+    """
+    Searches a log file for ERROR (or other level) lines within a time window around a
+    given timestamp. Returns a bounded, de-duplicated summary instead of every raw line.
+    If a service is given, every log segment of that service is searched instead of log_file.
     """
     print(f"--- 🛠️ Tool: Running search_logs around {timestamp_str} ---")
 
@@ -24,72 +73,100 @@ def search_logs(timestamp_str, log_file="mock_service.log", time_window_seconds=
     start_time = alert_time - datetime.timedelta(seconds=time_window_seconds / 2)
     end_time = alert_time + datetime.timedelta(seconds=time_window_seconds / 2)
 
-    found_errors = []
-
     try:
-        with open(log_file, 'r') as f:
-            for line in f:
-                if "ERROR" not in line:
-                    continue # Skip lines that aren't errors, this is fast.
-
-                # Try to parse the log line timestamp
-                try:
-                    log_timestamp_str = line.split('Z')[0]
-                    log_time = datetime.datetime.fromisoformat(log_timestamp_str + '+00:00')
-
-                    # Check if the error is within our time window
-                    if start_time <= log_time <= end_time:
-                        found_errors.append(line.strip())
-
-                except (ValueError, IndexError):
-                    # This log line has a malformed date, skip it.
-                    continue
+        if service:
+            matches = search_service_logs(service, start_time, end_time, levels=levels, pattern=pattern,
+                                          max_signatures=MAX_LOG_SIGNATURES)
+        else:
+            matches = iter_log_matches(start_time, end_time, log_file, levels=levels, pattern=pattern)
+        found_errors = summarize_matches(matches, max_results=max_results, max_bytes=max_bytes)
 
     except FileNotFoundError:
         print(f"--- ❌ Tool Error: Log file {log_file} not found. ---")
         return ["ERROR: Log file not found."]
+    except re.error as e:
+        print(f"--- ❌ Tool Error: Invalid pattern {pattern!r}: {e} ---")
+        return [f"ERROR: Invalid pattern: {e}"]
 
-    print(f"--- 🛠️ Tool: Found {len(found_errors)} error(s). ---")
+    print(f"--- 🛠️ Tool: Found {len(found_errors)} distinct message(s). ---")
     return found_errors
 
-def search_runbooks(query_text):
+RUNBOOK_TOP_K = int(os.environ.get("RUNBOOK_TOP_K", 3))
+RUNBOOK_SEARCH_SQL = """
+    SELECT id, content, section, service, source_file, 1 - (embedding <=> %(vector)s) AS score
+    FROM runbook_chunks
+    WHERE %(service)s::text IS NULL OR service = %(service)s OR service IS NULL
+    ORDER BY embedding <=> %(vector)s
+    LIMIT %(top_k)s
+"""
+
+async def search_runbooks(query_text, service=None, top_k=RUNBOOK_TOP_K):
     """
     Searches the runbook knowledge base for relevant remediation steps using Vector Search.
+    Returns the top_k chunks with their similarity scores, restricted to the given
+    service's runbooks (plus runbooks that apply to every service).
     """
     print(f"--- 📚 Tool: Searching runbooks for: '{query_text}' ---")
 
     try:
-        # 1. Turn the query (e.g., "High CPU fix") into a vector using Google
-        model_name = "models/text-embedding-004"
-        result = genai.embed_content(
-            model=model_name,
-            content=query_text,
-            task_type="retrieval_query"
-        )
-        query_vector = result['embedding']
-
-        # 2. Search Postgres for the nearest neighbor
-        with psycopg.connect(DB_CONNECTION, autocommit=True) as conn:
-            register_vector(conn)
-
-            # The <=> operator is "Cosine Distance"
-            # LIMIT 1 means "give me the single best match"
-            result = conn.execute(
-                """
-                SELECT content 
-                FROM runbook_chunks 
-                ORDER BY embedding <=> %s 
-                LIMIT 1
-                """,
-                (query_vector,)
-            ).fetchone()
-
-            if result:
-                print("--- 📚 Tool: Found relevant runbook entry! ---")
-                return result[0] # Return the text content
-            else:
-                return "No relevant runbooks found."
+        # 1. Turn the query (e.g., "High CPU fix") into a vector using Google.
+        # Repeat symptoms are served from the embedding cache.
+        query_vector = await embed_query_async(query_text)
+        stats = get_embedding_cache().stats()
+        print(f"--- 📚 Tool: Embedding cache hits={stats['hits']} disk_hits={stats['disk_hits']} misses={stats['misses']} ---")
+
+        # 2. Search Postgres for the nearest neighbours, on a pooled connection
+        pool = await get_pool()
+        async with pool.connection() as conn:
+            # The <=> operator is "Cosine Distance"; the ANN index serves the ORDER BY.
+            # With a service filter the index keeps scanning until top_k rows pass it
+            # (iterative scan, see src/db.py).
+            # prepare=True: the plan is prepared once per connection and reused
+            params = {"vector": query_vector, "service": service, "top_k": top_k}
+            cursor = await conn.execute(RUNBOOK_SEARCH_SQL, params, prepare=True)
+            rows = await cursor.fetchall()
+
+            if service and len(rows) < top_k:
+                # Without iterative scans (pgvector < 0.8) the filter only sees the index's
+                # candidate set and can come back short; rank the filtered rows exactly.
+                async with conn.transaction():
+                    await conn.execute("SET LOCAL enable_indexscan = off")
+                    cursor = await conn.execute(RUNBOOK_SEARCH_SQL, params)
+                    rows = await cursor.fetchall()
+
+        # relaxed_order iterative scans may return neighbours slightly out of order
+        rows.sort(key=lambda row: -row[5])
+
+        if not rows:
+            return "No relevant runbooks found."
+
+        print(f"--- 📚 Tool: Found {len(rows)} relevant runbook entries! ---")
+        return [
+            {
+                "id": chunk_id,
+                "content": content,
+                "section": section,
+                "service": chunk_service,
+                "source": source_file,
+                "score": round(float(score), 4),
+            }
+            for chunk_id, content, section, chunk_service, source_file, score in rows
+        ]
 
     except Exception as e:
         print(f"--- ❌ Tool Error: {e} ---")
         return f"Error searching runbooks: {e}"
+
+async def runbook_corpus_version():
+    """
+    The version src/ingest.py bumps on every corpus change, or None if it can't be read.
+    """
+    try:
+        pool = await get_pool()
+        async with pool.connection() as conn:
+            cursor = await conn.execute("SELECT version FROM runbook_corpus WHERE id = 1")
+            row = await cursor.fetchone()
+        return row[0] if row else None
+    except Exception as e:
+        print(f"--- ❌ Tool Error: Could not read runbook corpus version: {e} ---")
+        return None
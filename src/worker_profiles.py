@@ -0,0 +1,93 @@
+import os
+from datetime import timedelta
+
+from src.workflows import IncidentWorkflow
+from src.activities import (
+    run_investigation, execute_remediation, record_incident, send_notification, prefetch_logs, prefetch_runbooks
+)
+from src.task_queues import WORKFLOW_TASK_QUEUE, INVESTIGATION_TASK_QUEUE, TOOLS_TASK_QUEUE, REMEDIATION_TASK_QUEUE
+
+# --- WORKER PROFILES ---
+# A profile is one Temporal Worker: a task queue, what runs on it, and its limits.
+# Run them all in one process (the default, for local use) or split them across
+# processes and hosts, e.g. many "investigation" workers for the LLM-bound tier.
+#
+# Every limit can be overridden per profile from the environment:
+#   <PROFILE>_MAX_CONCURRENT_ACTIVITIES      activity slots per worker process
+#   <PROFILE>_MAX_ACTIVITIES_PER_SECOND      start rate per worker process
+#   <PROFILE>_MAX_TASK_QUEUE_ACTIVITIES_PER_SECOND
+#                                            start rate across *all* workers of the queue
+#                                            (enforced by the Temporal server), e.g. to
+#                                            stay under the LLM provider's quota
+#   WORKFLOWS_MAX_CONCURRENT_WORKFLOW_TASKS
+
+WORKER_DRAIN_SECONDS = float(os.environ.get("WORKER_DRAIN_SECONDS", 120))
+
+# Before the split every activity ran on the workflow queue. Activities that
+# in-flight workflows already scheduled there still need a poller, so the
+# workflows profile keeps them registered for one more release.
+LEGACY_ACTIVITIES = [
+    run_investigation, execute_remediation, record_incident, send_notification, prefetch_logs, prefetch_runbooks
+]
+
+PROFILES = {
+    "workflows": {
+        "task_queue": WORKFLOW_TASK_QUEUE,
+        "workflows": [IncidentWorkflow],
+        "activities": LEGACY_ACTIVITIES,
+        "max_concurrent_workflow_tasks": 100,
+    },
+    "investigation": {
+        # Mostly waiting on the LLM: many slots. Cap the start rate across the whole tier
+        # with INVESTIGATION_MAX_TASK_QUEUE_ACTIVITIES_PER_SECOND.
+        "task_queue": INVESTIGATION_TASK_QUEUE,
+        "activities": [run_investigation],
+        "max_concurrent_activities": 50,
+    },
+    "tools": {
+        # Short, I/O-bound: pre-fetch searches, store writes, notifications
+        "task_queue": TOOLS_TASK_QUEUE,
+        "activities": [prefetch_logs, prefetch_runbooks, record_incident, send_notification],
+        "max_concurrent_activities": 100,
+    },
+    "remediation": {
+        # Touches production: few at a time
+        "task_queue": REMEDIATION_TASK_QUEUE,
+        "activities": [execute_remediation],
+        "max_concurrent_activities": 2,
+        "max_task_queue_activities_per_second": 1.0,
+    },
+}
+
+# Profiles whose activities query Postgres (runbook search); only they open the pool
+# at startup. Others open it lazily if a (legacy) activity ever needs it.
+DB_PROFILES = ("investigation", "tools")
+
+_INT_LIMITS = ("max_concurrent_activities", "max_concurrent_workflow_tasks")
+_FLOAT_LIMITS = ("max_activities_per_second", "max_task_queue_activities_per_second")
+
+
+def profile_options(name):
+    """
+    Worker(...) keyword arguments for a profile, with environment overrides applied.
+    """
+    if name not in PROFILES:
+        raise ValueError(f"Unknown worker profile '{name}'. Choose from: {', '.join(PROFILES)}, all")
+
+    options = dict(PROFILES[name])
+    for key in _INT_LIMITS + _FLOAT_LIMITS:
+        value = os.environ.get(f"{name.upper()}_{key.upper()}")
+        if value:
+            options[key] = int(value) if key in _INT_LIMITS else float(value)
+    options["graceful_shutdown_timeout"] = timedelta(seconds=WORKER_DRAIN_SECONDS)
+    return options
+
+
+def resolve_profiles(names):
+    """
+    "all" or "investigation,tools" -> list of profile names.
+    """
+    names = [name.strip() for name in names.split(",") if name.strip()]
+    if not names or "all" in names:
+        return list(PROFILES)
+    return names
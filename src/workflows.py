@@ -3,6 +3,8 @@ import dataclasses
 from datetime import timedelta
 import asyncio
 from temporalio.common import RetryPolicy
+from temporalio.exceptions import ActivityError
+from src.task_queues import INVESTIGATION_TASK_QUEUE, TOOLS_TASK_QUEUE, REMEDIATION_TASK_QUEUE
 
 # Call activities by string name to ensure determinism
 
@@ -11,6 +13,14 @@ class IncidentWorkflow:
     def __init__(self):
         self.is_approved = False
         self.summary = "Investigation in progress..." # <--- NEW: State variable
+        self.summary_version = 0 # Bumped on every summary change; lets the API cache query results
+        self.alert_count = 0 # Repeat alerts coalesced into this incident
+
+    # Repeat alerts for the same incident arrive here instead of starting a new
+    # investigation (the API signals a running workflow before starting one).
+    @workflow.signal
+    def alert_received(self, alert: dict):
+        self.alert_count += 1
 
     @workflow.signal
     def approve_action(self):
@@ -21,45 +31,155 @@ class IncidentWorkflow:
     def get_current_summary(self) -> str:
         return self.summary
 
+    @workflow.query
+    def get_summary_state(self) -> dict:
+        return {"summary": self.summary, "version": self.summary_version}
+
+    @workflow.query
+    def get_alert_count(self) -> int:
+        return self.alert_count
+
+    def set_summary(self, summary):
+        self.summary = summary
+        self.summary_version += 1
+
+    async def record(self, **fields):
+        """
+        Writes a status/summary change through to the incident store.
+        """
+        if not workflow.patched("record-incident"):
+            return  # Started before the incident store existed; keep its history replayable
+        await workflow.execute_activity(
+            "record_incident",
+            {"id": workflow.info().workflow_id, "summary_version": self.summary_version, **fields},
+            task_queue=TOOLS_TASK_QUEUE,
+            start_to_close_timeout=timedelta(seconds=10),
+            retry_policy=RetryPolicy(maximum_attempts=5)
+        )
+
+    async def prefetch(self, alert):
+        """
+        Log search and runbook search as separate activities. A part that fails is
+        left out (None); the agent can still fetch it with its tools.
+        """
+        logs, runbooks = await asyncio.gather(
+            workflow.execute_activity(
+                "prefetch_logs",
+                alert,
+                task_queue=TOOLS_TASK_QUEUE,
+                start_to_close_timeout=timedelta(minutes=2),
+                heartbeat_timeout=timedelta(seconds=30),
+                retry_policy=RetryPolicy(maximum_attempts=2)
+            ),
+            workflow.execute_activity(
+                "prefetch_runbooks",
+                alert,
+                task_queue=TOOLS_TASK_QUEUE,
+                start_to_close_timeout=timedelta(seconds=45),
+                retry_policy=RetryPolicy(maximum_attempts=2)
+            ),
+            return_exceptions=True
+        )
+        for name, part in (("logs", logs), ("runbooks", runbooks)):
+            if isinstance(part, BaseException):
+                workflow.logger.warning(f"--- ⚠️ Pre-fetching {name} failed: {part} ---")
+        return {
+            "logs": None if isinstance(logs, BaseException) else logs,
+            "runbooks": None if isinstance(runbooks, BaseException) else runbooks,
+        }
+
+    def notify(self, alert, text, title):
+        """
+        Starts send_notification without waiting for it. Returns its handle, or None for
+        workflows started before notifications were an activity (keeps them replayable).
+        """
+        if not workflow.patched("notify-activity"):
+            return None
+        return workflow.start_activity(
+            "send_notification",
+            {"text": text, "title": title, "channel": alert["service"]},
+            task_queue=TOOLS_TASK_QUEUE,
+            start_to_close_timeout=timedelta(minutes=2),
+            retry_policy=RetryPolicy(maximum_attempts=3, initial_interval=timedelta(seconds=5))
+        )
+
+    async def drain(self, notifications):
+        """
+        Waits for background notifications before the workflow completes; a failed
+        notification is logged, never fatal.
+        """
+        notifications = [handle for handle in notifications if handle is not None]
+        for result in await asyncio.gather(*notifications, return_exceptions=True):
+            if isinstance(result, BaseException):
+                workflow.logger.warning(f"--- ⚠️ Notification failed: {result} ---")
+
     @workflow.run
     async def run(self, alert: dict) -> str:
         workflow.logger.info(f"--- 🏁 Workflow started for {alert['service']} ---")
+        # The starting alert (runs started by signal-with-start already counted it)
+        self.alert_count = max(self.alert_count, 1)
 
-        # 1. Run the Investigation
-        investigation_summary = await workflow.execute_activity(
-            "run_investigation",
-            alert,
-            start_to_close_timeout=timedelta(minutes=5),
-            retry_policy=RetryPolicy(maximum_attempts=3)
-        )
+        # 1. Pre-fetch the evidence every investigation starts with, in parallel,
+        #    so the LLM's first turn can already reason about it
+        investigation_args = [alert]
+        if workflow.patched("prefetch-evidence"):
+            investigation_args.append(await self.prefetch(alert))
+
+        # 2. Run the Investigation
+        try:
+            investigation_summary = await workflow.execute_activity(
+                "run_investigation",
+                args=investigation_args,
+                task_queue=INVESTIGATION_TASK_QUEUE,
+                start_to_close_timeout=timedelta(minutes=5),
+                # The activity heartbeats while it runs, so a stuck worker is detected quickly
+                heartbeat_timeout=timedelta(seconds=30),
+                retry_policy=RetryPolicy(maximum_attempts=3)
+            )
+        except ActivityError:
+            # Out of retries: close the incident so it stops showing as "investigating"
+            await self.record(status="failed")
+            raise
 
         # Save the result to our state variable so the UI can see it
-        self.summary = investigation_summary
+        self.set_summary(investigation_summary)
+        await self.record(status="awaiting_approval", summary=investigation_summary)
+
+        # Notify in the background; delivery (batching, rate limits, retries) is not
+        # on the path to approval
+        notifications = [self.notify(alert, investigation_summary, "Fireline Investigation Complete")]
 
-        # 2. WAITING FOR HUMAN APPROVAL
+        # 3. WAITING FOR HUMAN APPROVAL
         workflow.logger.info(f"--- 🤖 AI Summary: {investigation_summary} ---")
         workflow.logger.info("--- ✋ Remediation found. WAITING FOR HUMAN APPROVAL... ---")
 
-        # 3. THE PAUSE
+        # 4. THE PAUSE
         try:
             await workflow.wait_condition(
                 lambda: self.is_approved, 
                 timeout=timedelta(seconds=120)
             )
         except asyncio.TimeoutError:
-            self.summary = "Approval timed out."
+            self.set_summary("Approval timed out.")
+            await self.record(status="timed_out", summary=investigation_summary)
+            await self.drain(notifications)
             return "Investigation complete. Fix proposed but timed out waiting for approval."
 
-        # 4. Execute Remediation
+        # 5. Execute Remediation
         workflow.logger.info("--- 👮‍♂️ Approval received! Executing fix... ---")
+        await self.record(status="approved")
 
         execution_result = await workflow.execute_activity(
             "execute_remediation",
             "kubectl rollout undo deployment/auth-service",
+            task_queue=REMEDIATION_TASK_QUEUE,
             start_to_close_timeout=timedelta(minutes=1)
         )
 
         final_report = f"{investigation_summary}\n\nACTION TAKEN: {execution_result}"
-        self.summary = final_report # Update state with final result
+        self.set_summary(final_report) # Update state with final result
+        await self.record(status="remediated", summary=final_report)
+        notifications.append(self.notify(alert, final_report, "Fireline Remediation Executed"))
+        await self.drain(notifications)
 
         return final_report
\ No newline at end of file
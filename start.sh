@@ -6,7 +6,7 @@ sleep 10
 
 # 2. Run Ingestion (Database Setup)
 echo "--- 📚 Checking Database... ---"
-python src/ingest.py
+python -m src.ingest
 
 # 3. Start Worker (Background)
 echo "--- 👷 Starting Worker... ---"
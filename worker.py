@@ -1,29 +1,157 @@
+import os
+import time
+import signal
 import asyncio
+import argparse
+import multiprocessing
 from temporalio.client import Client
 from temporalio.worker import Worker
 
-# 1. IMPORT YOUR NEW WORKFLOW AND ACTIVITY
-from src.workflows import IncidentWorkflow
-from src.activities import run_investigation, execute_remediation
-async def main():
-    print("--- 👟 Temporal Worker starting... ---")
-    # Connect to the local Temporal server
-    client = await Client.connect("127.0.0.1:7233")
-
-    # 2. CREATE THE WORKER
-    # This worker connects to Temporal and "listens"
-    # on a specific "task queue" for jobs.
-    worker = Worker(
-        client,
-        task_queue="fireline-task-queue", # <-- This name must match the API
-        workflows=[IncidentWorkflow],    # <-- Tell it about your workflow
-        activities=[run_investigation, execute_remediation],  # <-- Tell it about your activity
-    )
-    print("--- ✅ Temporal Worker connected and listening on 'fireline-task-queue' ---")
-
-    # 3. RUN THE WORKER
-    # This will run forever until you press CTRL+C
-    await worker.run()
+# 1. IMPORT THE WORKER PROFILES (workflow + activities per task queue)
+from src.worker_profiles import profile_options, resolve_profiles, DB_PROFILES
+from src.db import open_pool, close_pool
+from src.tool_executor import get_tool_executor
+from src.notifications import close_notification_dispatcher
+
+# Which profiles this host runs, and how many processes of them.
+#   python worker.py                                   # everything, one process (local)
+#   python worker.py --profiles investigation -n 8     # scale the LLM-bound tier
+#   python worker.py --profiles workflows,tools,remediation
+WORKER_PROFILES = os.environ.get("WORKER_PROFILES", "all")
+WORKER_PROCESSES = int(os.environ.get("WORKER_PROCESSES", 1))
+TEMPORAL_ADDRESS = os.environ.get("TEMPORAL_ADDRESS", "127.0.0.1:7233")
+# Crashed children are restarted after 1s, 2s, 4s, ... (capped), and given up on
+# after WORKER_MAX_RESTARTS crashes in a row (e.g. a config error that never heals)
+WORKER_MAX_RESTARTS = int(os.environ.get("WORKER_MAX_RESTARTS", 5))
+WORKER_RESTART_MAX_DELAY = 30
+WORKER_RESTART_RESET_SECONDS = 60
+
+
+async def main(profiles):
+    print(f"--- 👟 Temporal Worker starting ({', '.join(profiles)}, pid {os.getpid()})... ---")
+    # Connect to the Temporal server
+    client = await Client.connect(TEMPORAL_ADDRESS)
+
+    # 2. CREATE THE WORKERS
+    # One Worker per profile, each listening on its own task queue with its own limits.
+    workers = []
+    for name in profiles:
+        options = profile_options(name)
+        workers.append(Worker(client, **options))
+        print(f"--- ✅ Worker '{name}' listening on '{options['task_queue']}' ---")
+
+    # 3. OPEN THE SHARED DB POOL
+    # One pool for the whole worker process; activities borrow connections from it.
+    if any(name in DB_PROFILES for name in profiles):
+        await open_pool()
+
+    # 4. GRACEFUL DRAIN
+    # SIGTERM/SIGINT: stop polling for new tasks, let in-flight activities finish
+    # (up to WORKER_DRAIN_SECONDS), then exit.
+    loop = asyncio.get_running_loop()
+    stopping = asyncio.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stopping.set)
+
+    # 5. RUN THE WORKERS
+    # This will run until the process is told to stop
+    runs = [asyncio.create_task(worker.run()) for worker in workers]
+    try:
+        await asyncio.wait([asyncio.create_task(stopping.wait()), *runs], return_when=asyncio.FIRST_COMPLETED)
+        print(f"--- 🛑 Worker {os.getpid()}: draining in-flight activities... ---")
+        await asyncio.gather(*(worker.shutdown() for worker in workers), return_exceptions=True)
+        for result in await asyncio.gather(*runs, return_exceptions=True):
+            if isinstance(result, Exception):
+                raise result  # A worker that crashed (not drained) fails the process
+    finally:
+        await close_pool()
+        get_tool_executor().shutdown()
+        await close_notification_dispatcher()
+        print(f"--- 👋 Worker {os.getpid()} stopped ---")
+
+
+def run_process(profiles):
+    asyncio.run(main(profiles))
+
+
+def launch(profiles, processes):
+    """
+    Runs `processes` copies of the worker, restarts any that crash (with backoff, up to
+    WORKER_MAX_RESTARTS in a row), and forwards SIGTERM/SIGINT so every child drains
+    before the launcher exits. A child that exits cleanly is not restarted.
+    """
+    ctx = multiprocessing.get_context("spawn")
+    children = {}  # slot -> (process, started_at)
+    failures = {}  # slot -> crashes in a row
+    restarts = {}  # slot -> when to restart it
+    stopping = False
+
+    def start(slot):
+        process = ctx.Process(target=run_process, args=(profiles,), name=f"fireline-worker-{slot}")
+        process.start()
+        children[slot] = (process, time.monotonic())
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        restarts.clear()
+        for process, _ in children.values():
+            if process.is_alive():
+                os.kill(process.pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for slot in range(processes):
+        start(slot)
+    print(f"--- 🚀 Launched {processes} worker process(es) for {', '.join(profiles)} ---")
+
+    gave_up = False
+    while children or restarts:
+        for slot, (process, started_at) in list(children.items()):
+            process.join(timeout=1 / max(1, len(children)))
+            if process.is_alive():
+                continue
+            del children[slot]
+            if stopping or process.exitcode == 0:
+                continue
+
+            # A child that ran for a while before crashing starts a fresh backoff
+            if time.monotonic() - started_at > WORKER_RESTART_RESET_SECONDS:
+                failures[slot] = 0
+            failures[slot] = failures.get(slot, 0) + 1
+            if failures[slot] > WORKER_MAX_RESTARTS:
+                print(f"--- ❌ Worker process {process.pid} exited ({process.exitcode}) "
+                      f"{failures[slot]} times in a row; not restarting it ---")
+                gave_up = True
+                continue
+            delay = min(WORKER_RESTART_MAX_DELAY, 2 ** (failures[slot] - 1))
+            print(f"--- ⚠️ Worker process {process.pid} exited ({process.exitcode}); restarting in {delay}s ---")
+            restarts[slot] = time.monotonic() + delay
+
+        for slot, at in list(restarts.items()):
+            if time.monotonic() >= at:
+                del restarts[slot]
+                start(slot)
+        if not children and restarts:
+            time.sleep(0.5)
+
+    if gave_up:
+        raise SystemExit(1)
+
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description="Fireline Temporal worker")
+    parser.add_argument("--profiles", default=WORKER_PROFILES,
+                        help="Comma-separated profiles: workflows, investigation, tools, remediation, or all")
+    parser.add_argument("-n", "--processes", type=int, default=WORKER_PROCESSES,
+                        help="Worker processes to run on this host")
+    args = parser.parse_args()
+
+    selected = resolve_profiles(args.profiles)
+    for name in selected:
+        profile_options(name)  # Fail fast on a typo
+    if args.processes <= 1:
+        run_process(selected)
+    else:
+        launch(selected, args.processes)